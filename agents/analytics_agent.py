@@ -2,9 +2,22 @@
 import sqlite3
 import os
 import json
+import re
+import threading
 import uuid
 from langchain.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
+from agents.llm_clients import get_llm
+from utils.llm_pool import CircuitOpenError, LLMUnavailableError
+
+# File d'attente vers l'écrivain analytics unique (mode multi-worker), None sinon
+_writer_queue = None
+# Thread de rejeu des analyses en attente (mode mono-processus)
+_replayer = None
+
+# Une analyse en attente passe en échec définitif après ce nombre de tentatives
+MAX_PENDING_ATTEMPTS = 5
+# Intervalle (s) entre deux reprises des analyses en attente
+PENDING_RETRY_INTERVAL = 60
 
 
 # ==========================
@@ -17,6 +30,8 @@ def init_analytics_db():
     
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
+    # Mode WAL : les lectures concurrentes ne bloquent pas l'écrivain
+    cursor.execute("PRAGMA journal_mode=WAL")
     
     # Vérifier si la table existe déjà
     cursor.execute("""
@@ -42,6 +57,37 @@ def init_analytics_db():
         """)
         conn.commit()
         print("✅ Table chat_analytics créée avec succès.")
+
+    # Analyses en attente (LLM indisponible) : rejouées plus tard
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS pending_analytics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id TEXT,
+        user_message TEXT,
+        agent_response TEXT,
+        chat_history TEXT,
+        chat_duration REAL,
+        attempts INTEGER DEFAULT 0,
+        last_error TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    # Analyses en échec définitif (réponse LLM invalide, trop de tentatives) : à inspecter
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS failed_analytics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id TEXT,
+        user_message TEXT,
+        agent_response TEXT,
+        chat_history TEXT,
+        chat_duration REAL,
+        attempts INTEGER,
+        last_error TEXT,
+        raw_response TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.commit()
     
     conn.close()
 
@@ -49,31 +95,53 @@ def init_analytics_db():
 # ==========================
 # Analyse LLM avec historique
 # ==========================
+def parse_analysis(text: str) -> dict:
+    """
+    Extrait le JSON d'analyse de la réponse du LLM (éventuelles balises ```json comprises).
+
+    Raises:
+        ValueError: si la réponse n'est pas un JSON valide ou si le score est absent ou invalide
+    """
+    text = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", text.strip())
+    data = json.loads(text)
+    if not isinstance(data, dict) or "satisfaction_score" not in data:
+        raise ValueError("satisfaction_score manquant")
+    score = float(data["satisfaction_score"])
+    if not 0 <= score <= 1:
+        raise ValueError(f"satisfaction_score hors de [0, 1]: {score}")
+    return {
+        "theme": data.get("theme") or "autre",
+        "satisfaction_score": score,
+        "remarque": data.get("remarque", ""),
+        "improvement_suggestion": data.get("improvement_suggestion")  # Peut être None
+    }
+
+
 def analyze_conversation(
     user_message: str,
     agent_response: str,
     chat_history: str,
-    duration: float
+    duration: float,
+    chat_id: str = None
 ) -> dict:
     """
-    Analyse une conversation complète avec le LLM.
+    Analyse une conversation complète avec le LLM. Aucun score n'est inventé :
+    - LLM indisponible (quota, circuit ouvert) : statut "pending", l'analyse sera rejouée ;
+    - réponse invalide ou erreur non transitoire : statut "failed", elle n'est pas rejouée.
     
     Args:
         user_message: Dernier message du client
         agent_response: Dernière réponse de l'agent
         chat_history: Historique complet de la conversation
         duration: Durée totale de la conversation
+        chat_id: Identifiant à réutiliser (rejeu d'une analyse en attente)
         
     Returns:
-        dict: Contient chat_id, theme, satisfaction_score, remarque
+        dict: Contient chat_id, status ("ok", "pending" ou "failed"), theme, satisfaction_score, remarque
     """
-    chat_id = str(uuid.uuid4())
+    chat_id = chat_id or str(uuid.uuid4())
 
-    llm_analyse = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0.2,
-        api_key=os.getenv("GEMINI_API_KEY")
-    )
+    llm_analyse = get_llm("gemini-2.5-flash", temperature=0.2)
 
     # Prompt prenant en compte l'historique complet
     analyse_prompt = PromptTemplate(
@@ -126,34 +194,40 @@ def analyze_conversation(
         agent_response=agent_response
     )
 
-    try:
-        result = llm_analyse.invoke(prompt_text).content
-        data = json.loads(result)
-        intent = data.get("theme", "autre")
-        satisfaction = float(data.get("satisfaction_score", 0.5))
-        remarque = data.get("remarque", "")
-        improvement_suggestion = data.get("improvement_suggestion")  # Peut être None
+    # Résultat sans score, avec les entrées nécessaires pour rejouer ou inspecter l'analyse
+    unscored = {
+        "chat_id": chat_id,
+        "theme": None,
+        "satisfaction_score": None,
+        "remarque": "",
+        "improvement_suggestion": None,
+        "duration": duration,
+        "user_message": user_message,
+        "agent_response": agent_response,
+        "chat_history": str(chat_history)
+    }
 
+    raw_response = None
+    try:
+        raw_response = llm_analyse.invoke(prompt_text).content
+        data = parse_analysis(raw_response)
+    except (LLMUnavailableError, CircuitOpenError) as e:
+        print(f"⚠️ LLM d'analyse indisponible, analyse mise en attente: {e}")
+        return {**unscored, "status": "pending", "last_error": str(e)}
     except Exception as e:
-        print(f"⚠️ Erreur lors de l'analyse LLM: {e}")
-        intent = "autre"
-        satisfaction = 0.5
-        remarque = ""
-        improvement_suggestion = None
+        # Réponse invalide (ou erreur non transitoire) : la rejouer ne changerait rien
+        print(f"❌ Analyse LLM invalide, enregistrée en échec: {e}")
+        return {**unscored, "status": "failed", "last_error": str(e), "raw_response": raw_response}
 
-    return {
-        "chat_id": chat_id,
-        "theme": intent,
-        "satisfaction_score": satisfaction,
-        "remarque": remarque,
-        "improvement_suggestion": improvement_suggestion,
-        "duration": duration
-    }
+    return {"chat_id": chat_id, "status": "ok", **data, "duration": duration}
 
 
 def store_analytics(analysis_result: dict) -> bool:
     """
     Stocke les résultats d'analyse dans la base de données.
+    Une analyse "pending" est placée dans la file des analyses en attente,
+    une analyse "failed" dans la table des échecs.
+    En mode multi-worker, le résultat est transmis à l'écrivain unique.
     
     Args:
         analysis_result: Dict contenant les résultats de analyze_conversation()
@@ -161,6 +235,25 @@ def store_analytics(analysis_result: dict) -> bool:
     Returns:
         bool: True si succès, False sinon
     """
+    if _writer_queue is not None:
+        _writer_queue.put(analysis_result)
+        return True
+    return _write_analysis(analysis_result)
+
+
+def _write_analysis(analysis_result: dict) -> bool:
+    """Écrit un résultat d'analyse dans la table correspondant à son statut."""
+    status = analysis_result.get("status")
+    if status == "pending":
+        return _insert_pending(analysis_result)
+    if status == "failed":
+        return _insert_failed(analysis_result)
+    # Une analyse rejouée avec succès quitte aussi la file d'attente
+    return _complete_pending(analysis_result)
+
+
+def _insert_analytics(analysis_result: dict) -> bool:
+    """Insère une ligne dans chat_analytics."""
     try:
         conn = sqlite3.connect("data/analytics/analytics.db")
         cursor = conn.cursor()
@@ -182,6 +275,219 @@ def store_analytics(analysis_result: dict) -> bool:
         return False
 
 
+def _insert_pending(analysis_result: dict) -> bool:
+    """
+    Ajoute une analyse en attente, ou met à jour son nombre d'échecs si elle existe déjà.
+    Après MAX_PENDING_ATTEMPTS échecs, elle est déplacée dans failed_analytics.
+    """
+    try:
+        conn = sqlite3.connect("data/analytics/analytics.db")
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE pending_analytics SET attempts = attempts + 1, last_error = ?
+            WHERE chat_id = ?
+        """, (analysis_result.get("last_error"), analysis_result["chat_id"]))
+        if cursor.rowcount == 0:
+            cursor.execute("""
+                INSERT INTO pending_analytics (chat_id, user_message, agent_response, chat_history, chat_duration, attempts, last_error)
+                VALUES (?, ?, ?, ?, ?, 1, ?)
+            """, (
+                analysis_result["chat_id"],
+                analysis_result["user_message"],
+                analysis_result["agent_response"],
+                analysis_result["chat_history"],
+                analysis_result["duration"],
+                analysis_result.get("last_error")
+            ))
+        cursor.execute("""
+            INSERT INTO failed_analytics (chat_id, user_message, agent_response, chat_history, chat_duration, attempts, last_error)
+            SELECT chat_id, user_message, agent_response, chat_history, chat_duration, attempts, last_error
+            FROM pending_analytics WHERE chat_id = ? AND attempts >= ?
+        """, (analysis_result["chat_id"], MAX_PENDING_ATTEMPTS))
+        if cursor.rowcount:
+            print(f"❌ Analyse {analysis_result['chat_id']} abandonnée après {MAX_PENDING_ATTEMPTS} tentatives (failed_analytics)")
+            cursor.execute("DELETE FROM pending_analytics WHERE chat_id = ?", (analysis_result["chat_id"],))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        print(f"❌ Erreur lors de la mise en attente de l'analyse: {e}")
+        return False
+
+
+def _insert_failed(analysis_result: dict) -> bool:
+    """Enregistre une analyse en échec définitif et la retire de la file d'attente."""
+    try:
+        conn = sqlite3.connect("data/analytics/analytics.db")
+        cursor = conn.cursor()
+        cursor.execute("SELECT attempts FROM pending_analytics WHERE chat_id = ?", (analysis_result["chat_id"],))
+        row = cursor.fetchone()
+        cursor.execute("""
+            INSERT INTO failed_analytics (chat_id, user_message, agent_response, chat_history, chat_duration, attempts, last_error, raw_response)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            analysis_result["chat_id"],
+            analysis_result["user_message"],
+            analysis_result["agent_response"],
+            analysis_result["chat_history"],
+            analysis_result["duration"],
+            (row[0] if row else 0) + 1,
+            analysis_result.get("last_error"),
+            analysis_result.get("raw_response")
+        ))
+        cursor.execute("DELETE FROM pending_analytics WHERE chat_id = ?", (analysis_result["chat_id"],))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        print(f"❌ Erreur lors de l'enregistrement de l'analyse en échec: {e}")
+        return False
+
+
+def _complete_pending(analysis_result: dict) -> bool:
+    """Stocke une analyse réussie et la retire de la file d'attente si elle y était."""
+    if not _insert_analytics(analysis_result):
+        return False
+    try:
+        conn = sqlite3.connect("data/analytics/analytics.db")
+        conn.execute("DELETE FROM pending_analytics WHERE chat_id = ?", (analysis_result["chat_id"],))
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        print(f"❌ Erreur lors du retrait de l'analyse en attente: {e}")
+        return False
+
+
+def process_pending_analytics(limit: int = 3, embedding=None) -> int:
+    """
+    Rejoue les analyses en attente, des plus anciennes aux plus récentes.
+    S'arrête au premier rejeu encore en attente : le LLM est sans doute toujours indisponible.
+    Les résultats passent par store_analytics() (donc par l'écrivain unique en multi-worker).
+    
+    Args:
+        limit: Nombre maximum d'analyses rejouées
+        embedding: Modèle d'embedding transmis au manager (optionnel)
+        
+    Returns:
+        int: Nombre d'analyses rejouées avec succès
+    """
+    from agents.manager_agent import manager_update
+
+    try:
+        conn = sqlite3.connect("data/analytics/analytics.db")
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT chat_id, user_message, agent_response, chat_history, chat_duration
+            FROM pending_analytics
+            WHERE attempts < ?
+            ORDER BY id
+            LIMIT ?
+        """, (MAX_PENDING_ATTEMPTS, limit))
+        rows = cursor.fetchall()
+        conn.close()
+    except Exception as e:
+        print(f"❌ Erreur lors de la lecture des analyses en attente: {e}")
+        return 0
+
+    processed = 0
+    needs_update = False
+    for chat_id, user_message, agent_response, chat_history, duration in rows:
+        analysis = analyze_conversation(user_message, agent_response, chat_history, duration, chat_id=chat_id)
+        if not store_analytics(analysis) or analysis["status"] == "pending":
+            break
+        if analysis["status"] == "ok":
+            processed += 1
+            needs_update = needs_update or analysis["satisfaction_score"] < 0.6
+
+    if processed:
+        print(f"🔁 {processed} analyse(s) en attente traitée(s)")
+    # En multi-worker, l'écrivain met à jour les guidelines en stockant les résultats
+    if needs_update and _writer_queue is None:
+        manager_update(embedding)
+    return processed
+
+
+def run_pending_replayer(interval: float = PENDING_RETRY_INTERVAL, embedding=None, stop_event=None) -> None:
+    """
+    Boucle de rejeu des analyses en attente, hors du chemin des requêtes
+    (thread dédié en mono-processus, processus dédié en multi-worker).
+    
+    Args:
+        interval: Secondes entre deux rejeux
+        embedding: Modèle d'embedding transmis au manager (optionnel)
+        stop_event: threading.Event qui arrête la boucle (optionnel)
+    """
+    stop_event = stop_event or threading.Event()
+    while not stop_event.wait(interval):
+        try:
+            process_pending_analytics(embedding=embedding)
+        except Exception as e:
+            print(f"❌ Erreur lors du rejeu des analyses en attente: {e}")
+
+
+def start_pending_replayer(embedding=None) -> threading.Thread:
+    """
+    Démarre (une seule fois par processus) le thread qui rejoue les analyses en attente
+    toutes les PENDING_RETRY_INTERVAL secondes, même quand aucune conversation ne se termine.
+    
+    Args:
+        embedding: Modèle d'embedding transmis au manager (optionnel)
+        
+    Returns:
+        threading.Thread: Thread de rejeu (daemon)
+    """
+    global _replayer
+    if _replayer is None or not _replayer.is_alive():
+        _replayer = threading.Thread(
+            target=run_pending_replayer,
+            kwargs={"embedding": embedding},
+            name="pending-replayer",
+            daemon=True
+        )
+        _replayer.start()
+    return _replayer
+
+
+# ==========================
+# Écrivain analytics unique (mode multi-worker)
+# ==========================
+def set_analytics_writer(writer_queue) -> None:
+    """
+    Redirige store_analytics() vers la file de l'écrivain unique.
+    
+    Args:
+        writer_queue: File multiprocessing consommée par run_analytics_writer(), ou None
+    """
+    global _writer_queue
+    _writer_queue = writer_queue
+
+
+def run_analytics_writer(writer_queue, embedding=None) -> None:
+    """
+    Boucle du processus écrivain : seul processus à écrire dans SQLite.
+    Il n'appelle jamais le LLM (le rejeu des analyses en attente tourne dans
+    son propre processus) ; il déclenche la mise à jour des guidelines, pour
+    qu'elle voie toujours les dernières analyses stockées.
+    
+    Args:
+        writer_queue: File multiprocessing ; None arrête la boucle
+        embedding: Modèle d'embedding pour stocker les guidelines avec leur vecteur (optionnel)
+    """
+    from agents.manager_agent import manager_update
+
+    init_analytics_db()
+    print("✍️ Écrivain analytics démarré.")
+    while True:
+        analysis = writer_queue.get()
+        if analysis is None:
+            break
+        _write_analysis(analysis)
+        if analysis.get("status") == "ok" and analysis["satisfaction_score"] < 0.6:
+            manager_update(embedding)
+    print("✍️ Écrivain analytics arrêté.")
+
+
 def analytics_agent(
     user_message: str,
     agent_response: str,
@@ -191,6 +497,8 @@ def analytics_agent(
     """
     Combine analyse + stockage en une seule fonction.
     Appelle le manager si satisfaction < 0.6 pour générer les guidelines d'amélioration.
+    Si le LLM est indisponible, l'analyse est mise en attente (statut "pending") et
+    rejouée par start_pending_replayer() ; une réponse invalide est en échec ("failed").
     
     Args:
         user_message: Dernier message du client
@@ -202,9 +510,16 @@ def analytics_agent(
         dict: Résultats d'analyse
     """
     from agents.manager_agent import manager_update
-    
+
     analysis = analyze_conversation(user_message, agent_response, chat_history, duration)
     store_analytics(analysis)
+
+    if analysis["status"] == "pending":
+        print("⏳ Analyse mise en attente, elle sera rejouée quand le LLM sera disponible.")
+        return analysis
+    if analysis["status"] == "failed":
+        print("❌ Analyse invalide, enregistrée dans failed_analytics.")
+        return analysis
     
     # Affichage
     msg = f"✅ Analyse stockée - Thème: {analysis['theme']}, Satisfaction: {analysis['satisfaction_score']}"
@@ -214,7 +529,8 @@ def analytics_agent(
     print(msg)
     
     # 🔄 Si satisfaction faible, appeler le manager pour mettre à jour les guidelines
-    if analysis['satisfaction_score'] < 0.6:
+    # (en mode multi-worker, c'est l'écrivain unique qui s'en charge)
+    if analysis['satisfaction_score'] < 0.6 and _writer_queue is None:
         print("📞 Appel du Manager pour mise à jour des guidelines...")
         manager_update()
     
@@ -0,0 +1,66 @@
+# agents/llm_clients.py
+import os
+import threading
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from utils.llm_pool import get_pool
+
+# Délai max (s) d'un appel Gemini : un appel bloqué libère son créneau du pool
+# et l'erreur de timeout est traitée comme transitoire (retry, puis mise en attente)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class PooledChatModel(BaseChatModel):
+    """Chat model LangChain dont chaque appel passe par le pool LLM partagé."""
+
+    inner: BaseChatModel
+    model_key: str
+
+    @property
+    def _llm_type(self) -> str:
+        return "pooled-chat-model"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return get_pool().call(
+            self.model_key,
+            lambda: self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        )
+
+    def get_num_tokens(self, text: str) -> int:
+        """Nombre de tokens compté par le tokenizer du modèle sous-jacent (Gemini)."""
+        return self.inner.get_num_tokens(text)
+
+
+def get_llm(model: str, temperature: float) -> PooledChatModel:
+    """
+    Retourne le client Gemini partagé pour (model, temperature).
+    Un seul client par configuration et par processus ; les retries sont gérés
+    par le pool, pas par le client.
+    """
+    key = (model, temperature)
+    with _clients_lock:
+        if key not in _clients:
+            inner = ChatGoogleGenerativeAI(
+                model=model,
+                temperature=temperature,
+                api_key=os.getenv("GEMINI_API_KEY"),
+                max_retries=1,
+                timeout=LLM_TIMEOUT
+            )
+            _clients[key] = PooledChatModel(inner=inner, model_key=model)
+        return _clients[key]
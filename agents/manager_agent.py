@@ -1,9 +1,42 @@
 # agents/manager_agent.py
 import sqlite3
+import hashlib
 import json
+import math
 import os
+import re
+import threading
+import unicodedata
 from datetime import datetime
 
+import numpy as np
+
+# Similarité (Jaccard sur les mots) au-delà de laquelle deux suggestions sont des doublons
+DUPLICATE_THRESHOLD = 0.7
+# Nombre maximum de guidelines injectées dans un prompt
+GUIDELINES_TOP_K = 3
+# Bonus donné aux guidelines dont le thème apparaît dans la question
+THEME_BOOST = 1.0
+# Rappel vectoriel : écart max de cosinus au meilleur score (relatif, jamais absolu :
+# les cosinus e5 de textes sans rapport restent élevés, seuls les écarts sont parlants)
+VECTOR_MARGIN = 0.03
+# Constante de la fusion par rangs (Reciprocal Rank Fusion) des résultats mots-clés et vecteurs
+RRF_K = 60
+
+GUIDELINES_FILE = "data/improvement_guidelines.json"
+# Embeddings des guidelines (clé : hash de la suggestion), hors du JSON pour qu'il reste léger
+GUIDELINES_VECTORS_FILE = "data/improvement_guidelines.npz"
+
+_STOPWORDS = {
+    "les", "des", "une", "est", "pour", "que", "qui", "dans", "par", "sur", "avec",
+    "pas", "plus", "son", "ses", "aux", "vous", "votre", "vos", "nous", "mon", "mes",
+    "client", "agent", "comment", "quoi", "est-ce", "bonjour", "merci",
+}
+
+# Préfixes attendus par les modèles e5 pour les requêtes et les passages
+E5_QUERY_PREFIX = "query: "
+E5_PASSAGE_PREFIX = "passage: "
+
 
 # ==========================
 # Récupération des suggestions d'amélioration
@@ -53,48 +86,49 @@ def fetch_low_satisfaction_suggestions(threshold: float = 0.6) -> list:
 def generate_improvement_guidelines(threshold: float = 0.6) -> dict:
     """
     Génère les guidelines d'amélioration basées sur les suggestions.
-    Les regroupe par thème pour faciliter la consultation.
+    Une entrée par suggestion ; l'agent de support les indexe par thème.
     
     Args:
         threshold: Seuil de satisfaction
         
     Returns:
-        dict: Guidelines organisées par thème
+        dict: Guidelines (liste "entries")
     """
     suggestions = fetch_low_satisfaction_suggestions(threshold)
     
-    # Organiser par thème
-    guidelines_by_theme = {}
-    for item in suggestions:
-        theme = item["theme"]
-        if theme not in guidelines_by_theme:
-            guidelines_by_theme[theme] = []
-        guidelines_by_theme[theme].append({
+    # Une entrée par suggestion (indexées par thème au moment de la recherche)
+    entries = [
+        {
+            "theme": item["theme"],
             "suggestion": item["suggestion"],
             "satisfaction_score": item["satisfaction_score"],
             "date": item["timestamp"]
-        })
+        }
+        for item in suggestions
+    ]
     
-    # Créer un résumé
     guidelines = {
         "last_updated": datetime.now().isoformat(),
         "threshold": threshold,
         "total_suggestions": len(suggestions),
-        "by_theme": guidelines_by_theme,
-        "summary": _generate_summary(guidelines_by_theme)
+        "entries": entries
     }
     
     return guidelines
 
 
-def _generate_summary(guidelines_by_theme: dict) -> str:
-    """Génère un résumé texte des guidelines principales."""
-    if not guidelines_by_theme:
+def _generate_summary(entries: list) -> str:
+    """Génère un résumé texte des guidelines principales (affichage console uniquement)."""
+    if not entries:
         return "Aucune suggestion d'amélioration disponible."
     
+    guidelines_by_theme = {}
+    for entry in entries:
+        guidelines_by_theme.setdefault(entry["theme"], []).append(entry)
+
     summary_lines = ["Points clés d'amélioration:"]
     for theme, items in guidelines_by_theme.items():
-        summary_lines.append(f"\n🔹 {theme.upper()}:")
+        summary_lines.append(f"\n🔹 {str(theme).upper()}:")
         # Garder les suggestions les plus récentes et pertinentes
         for item in items[:2]:  # Top 2 par thème
             summary_lines.append(f"  • {item['suggestion']}")
@@ -102,22 +136,235 @@ def _generate_summary(guidelines_by_theme: dict) -> str:
     return "\n".join(summary_lines)
 
 
-def store_guidelines(guidelines: dict) -> bool:
+# ==========================
+# Déduplication et index des guidelines
+# ==========================
+def _tokenize(text: str) -> set:
+    """Mots significatifs d'un texte, en minuscules et sans accents."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").lower()
+    return {word for word in re.findall(r"[a-z0-9]+", text) if len(word) > 2 and word not in _STOPWORDS}
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def deduplicate_guidelines(entries: list, threshold: float = DUPLICATE_THRESHOLD) -> list:
+    """
+    Fusionne les suggestions quasi identiques d'un même thème (une même suggestion
+    sous deux thèmes reste visible pour chacun d'eux).
+    La plus récente est gardée (les entrées arrivent triées par date décroissante)
+    et son champ "occurrences" compte les doublons fusionnés.
+    
+    Args:
+        entries: Liste des guidelines
+        threshold: Similarité de Jaccard à partir de laquelle deux suggestions sont fusionnées
+        
+    Returns:
+        list: Guidelines sans doublons
+    """
+    kept = []
+    kept_tokens = []
+    for entry in entries:
+        tokens = _tokenize(entry["suggestion"])
+        duplicate = next(
+            (
+                i for i, other in enumerate(kept_tokens)
+                if kept[i]["theme"] == entry["theme"] and _jaccard(tokens, other) >= threshold
+            ),
+            None
+        )
+        if duplicate is None:
+            kept.append(dict(entry, occurrences=entry.get("occurrences", 1)))
+            kept_tokens.append(tokens)
+        else:
+            kept[duplicate]["occurrences"] += entry.get("occurrences", 1)
+    return kept
+
+
+def _vector_key(suggestion: str) -> str:
+    """Clé d'une suggestion dans le fichier des embeddings."""
+    return hashlib.sha1(suggestion.encode("utf-8")).hexdigest()
+
+
+def _ranks(scores: dict) -> dict:
+    """Rang (1 = meilleur, ex aequo au même rang) de chaque index selon son score."""
+    values = sorted(scores.values(), reverse=True)
+    return {i: 1 + sum(v > score for v in values) for i, score in scores.items()}
+
+
+class GuidelineIndex:
+    """
+    Petit index des guidelines, clé par thème, à recherche hybride :
+    - mots-clés (pondérés par IDF) et thème de la question ;
+    - si un modèle d'embedding est fourni, similarité cosinus : les guidelines
+      proches du meilleur cosinus (VECTOR_MARGIN) sont aussi candidates, ce qui
+      retrouve les paraphrases sans mot commun ("Où est mon colis ?" -> livraison).
+    Les deux classements sont fusionnés par rangs (RRF).
+    """
+
+    def __init__(self, entries: list, embedding=None, vectors: dict = None):
+        self.entries = entries
+        self.embedding = embedding
+        self.tokens = [_tokenize(f"{e['theme']} {e['suggestion']}") for e in entries]
+        self.by_theme = {}
+        for i, entry in enumerate(entries):
+            self.by_theme.setdefault(entry["theme"], []).append(i)
+
+        document_frequency = {}
+        for tokens in self.tokens:
+            for token in tokens:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+        self.idf = {
+            token: math.log(1 + len(entries) / count)
+            for token, count in document_frequency.items()
+        }
+
+        # Embeddings stockés par store_guidelines ; les entrées qui n'en ont pas
+        # (ajoutées sans modèle) sont encodées ici, une seule fois, en un lot
+        self.vectors = None
+        if embedding is not None and entries:
+            stored = vectors or {}
+            rows = [stored.get(_vector_key(e["suggestion"]), e.get("embedding")) for e in entries]
+            missing = [i for i, row in enumerate(rows) if row is None]
+            if missing:
+                encoded = embedding.embed_documents([E5_PASSAGE_PREFIX + entries[i]["suggestion"] for i in missing])
+                for i, vector in zip(missing, encoded):
+                    rows[i] = vector
+            matrix = np.asarray(rows, dtype=np.float32)
+            self.vectors = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    @classmethod
+    def from_guidelines(cls, guidelines: dict, embedding=None, vectors: dict = None) -> "GuidelineIndex":
+        """
+        Construit l'index depuis load_guidelines() (et load_guideline_vectors()).
+        Les anciens fichiers sans "entries" sont relus depuis leur clé "by_theme".
+        """
+        entries = guidelines.get("entries")
+        if entries is None:
+            entries = deduplicate_guidelines([
+                {"theme": theme, **item}
+                for theme, items in guidelines.get("by_theme", {}).items()
+                for item in items
+            ])
+        return cls(entries, embedding, vectors)
+
+    def search(self, question: str, k: int = GUIDELINES_TOP_K) -> list:
+        """
+        Retourne au plus k guidelines pertinentes pour la question.
+        Sans modèle d'embedding, seules les guidelines ayant un mot ou le thème
+        en commun avec la question sont candidates (éventuellement aucune).
+        
+        Args:
+            question: Question du client
+            k: Nombre maximum de guidelines
+            
+        Returns:
+            list: Guidelines triées par pertinence
+        """
+        if not self.entries:
+            return []
+
+        question_tokens = _tokenize(question)
+        matched_themes = {
+            theme for theme in self.by_theme
+            if _tokenize(theme) and _tokenize(theme) <= question_tokens
+        }
+
+        keyword_scores = {}
+        for i, tokens in enumerate(self.tokens):
+            score = sum(self.idf[t] for t in tokens & question_tokens)
+            if self.entries[i]["theme"] in matched_themes:
+                score += THEME_BOOST
+            if score > 0:
+                keyword_scores[i] = score
+
+        vector_scores = {}
+        if self.vectors is not None:
+            query = np.asarray(self.embedding.embed_query(E5_QUERY_PREFIX + question), dtype=np.float32)
+            norm = float(np.linalg.norm(query))
+            if norm > 0:
+                cosines = self.vectors @ (query / norm)
+                best = float(cosines.max())
+                vector_scores = {
+                    i: float(score) for i, score in enumerate(cosines)
+                    if score >= best - VECTOR_MARGIN
+                }
+
+        fused = {}
+        for scores in (keyword_scores, vector_scores):
+            for i, rank in _ranks(scores).items():
+                fused[i] = fused.get(i, 0.0) + 1.0 / (RRF_K + rank)
+
+        # À pertinence égale, une suggestion souvent répétée passe devant
+        ranked = sorted(fused, key=lambda i: (fused[i], self.entries[i].get("occurrences", 1)), reverse=True)
+        return [self.entries[i] for i in ranked[:k]]
+
+
+def format_guidelines(entries: list) -> str:
+    """Met en forme les guidelines retenues pour le prompt."""
+    if not entries:
+        return "Aucune directive particulière."
+    return "\n".join(f"- [{e['theme']}] {e['suggestion']}" for e in entries)
+
+
+def _embed_entries(entries: list, embedding=None) -> dict:
+    """
+    Retourne les embeddings des entrées, par clé de suggestion.
+    Les embeddings déjà stockés sont réutilisés ; seules les nouvelles
+    suggestions sont encodées, en un seul lot (si un modèle est fourni).
+    """
+    stored = load_guideline_vectors()
+    vectors = {}
+    for entry in entries:
+        key = _vector_key(entry["suggestion"])
+        # Anciens fichiers : embedding stocké dans le JSON
+        vector = stored.get(key, entry.pop("embedding", None))
+        if vector is not None:
+            vectors[key] = vector
+
+    missing = list({
+        e["suggestion"]: e for e in entries if _vector_key(e["suggestion"]) not in vectors
+    }.values())
+    if missing and embedding is not None:
+        encoded = embedding.embed_documents([E5_PASSAGE_PREFIX + e["suggestion"] for e in missing])
+        for entry, vector in zip(missing, encoded):
+            vectors[_vector_key(entry["suggestion"])] = vector
+    return vectors
+
+
+def store_guidelines(guidelines: dict, embedding=None) -> bool:
     """
-    Stocke les guidelines dans un fichier JSON.
+    Stocke les guidelines dans un fichier JSON, et leurs embeddings dans un fichier .npz à côté.
+    Les suggestions quasi identiques sont fusionnées avant l'écriture ; les
+    nouvelles suggestions sont encodées si un modèle est fourni.
     
     Args:
         guidelines: Dict des guidelines à stocker
+        embedding: Modèle d'embedding (optionnel)
         
     Returns:
         bool: True si succès
     """
+    vectors = {}
+    if "entries" in guidelines:
+        guidelines["entries"] = deduplicate_guidelines(guidelines["entries"])
+        vectors = _embed_entries(guidelines["entries"], embedding)
+
     try:
         os.makedirs("data", exist_ok=True)
-        filepath = "data/improvement_guidelines.json"
-        with open(filepath, "w", encoding="utf-8") as f:
+        # Écriture atomique : un worker ne lit jamais un fichier à moitié écrit.
+        # Les vecteurs sont écrits avant le JSON : une entrée listée a toujours son vecteur
+        # (ou sera encodée à la lecture), et les vecteurs sont retrouvés par clé, pas par position.
+        if vectors:
+            keys = sorted(vectors)
+            with open(GUIDELINES_VECTORS_FILE + ".tmp", "wb") as f:
+                np.savez(f, keys=np.array(keys), vectors=np.asarray([vectors[k] for k in keys], dtype=np.float32))
+            os.replace(GUIDELINES_VECTORS_FILE + ".tmp", GUIDELINES_VECTORS_FILE)
+        with open(GUIDELINES_FILE + ".tmp", "w", encoding="utf-8") as f:
             json.dump(guidelines, f, indent=2, ensure_ascii=False)
-        print(f"✅ Guidelines mises à jour - {filepath}")
+        os.replace(GUIDELINES_FILE + ".tmp", GUIDELINES_FILE)
+        print(f"✅ Guidelines mises à jour - {GUIDELINES_FILE}")
         return True
     except Exception as e:
         print(f"❌ Erreur lors du stockage des guidelines: {e}")
@@ -131,30 +378,84 @@ def load_guidelines() -> dict:
     Returns:
         dict: Guidelines ou dict vide si fichier inexistant
     """
-    filepath = "data/improvement_guidelines.json"
     try:
-        if os.path.exists(filepath):
-            with open(filepath, "r", encoding="utf-8") as f:
+        if os.path.exists(GUIDELINES_FILE):
+            with open(GUIDELINES_FILE, "r", encoding="utf-8") as f:
                 return json.load(f)
     except Exception as e:
         print(f"⚠️ Impossible de charger les guidelines: {e}")
     
-    return {"by_theme": {}, "summary": "Aucune guideline disponible"}
+    return {"entries": []}
+
+
+def load_guideline_vectors() -> dict:
+    """
+    Charge les embeddings des guidelines stockés à côté du JSON.
+    
+    Returns:
+        dict: Vecteur (numpy) par clé de suggestion, vide si le fichier n'existe pas
+    """
+    try:
+        if os.path.exists(GUIDELINES_VECTORS_FILE):
+            with np.load(GUIDELINES_VECTORS_FILE) as data:
+                return dict(zip(data["keys"].tolist(), data["vectors"]))
+    except Exception as e:
+        print(f"⚠️ Impossible de charger les embeddings des guidelines: {e}")
+    return {}
+
+
+# Index mis en cache par processus, reconstruit seulement quand les fichiers changent
+_index_cache = {"key": None, "index": None}
+_index_lock = threading.Lock()
+
+
+def _file_signature(path: str):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+def get_guideline_index(embedding=None) -> GuidelineIndex:
+    """
+    Index des guidelines partagé par le processus : les fichiers ne sont relus
+    (et les entrées sans vecteur encodées) que lorsqu'ils ont changé sur disque.
+    
+    Args:
+        embedding: Modèle d'embedding pour la recherche vectorielle (optionnel)
+        
+    Returns:
+        GuidelineIndex: Index à jour
+    """
+    key = (_file_signature(GUIDELINES_FILE), _file_signature(GUIDELINES_VECTORS_FILE), id(embedding))
+    with _index_lock:
+        if _index_cache["key"] != key:
+            _index_cache["index"] = GuidelineIndex.from_guidelines(
+                load_guidelines(),
+                embedding,
+                load_guideline_vectors() if embedding is not None else None
+            )
+            _index_cache["key"] = key
+        return _index_cache["index"]
 
 
-def manager_update() -> dict:
+def manager_update(embedding=None) -> dict:
     """
     Fonction principale du manager : récupère suggestions et met à jour guidelines.
     
+    Args:
+        embedding: Modèle d'embedding pour encoder les nouvelles guidelines (optionnel)
+        
     Returns:
         dict: Guidelines mises à jour
     """
     print("🔄 Manager: Mise à jour des guidelines d'amélioration...")
     
     guidelines = generate_improvement_guidelines(threshold=0.6)
-    store_guidelines(guidelines)
+    store_guidelines(guidelines, embedding)
     
-    print(f"📊 {guidelines['total_suggestions']} suggestions analysées")
-    print(guidelines.get("summary", ""))
+    print(f"📊 {guidelines['total_suggestions']} suggestions analysées, {len(guidelines['entries'])} guidelines uniques")
+    print(_generate_summary(guidelines["entries"]))
     
     return guidelines
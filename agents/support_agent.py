@@ -1,29 +1,14 @@
 from langchain.prompts import PromptTemplate
 from langchain.chains import ConversationalRetrievalChain
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.memory import ConversationSummaryMemory
-import os
-from agents.manager_agent import load_guidelines
-    
-        
-def agent_support_fnac():
-    embedding = HuggingFaceEmbeddings(model_name="embaas/sentence-transformers-multilingual-e5-base")
-    vectordb = Chroma(persist_directory="./vectorstore/chroma", embedding_function=embedding)
-    retriever = vectordb.as_retriever(search_kwargs={"k": 5})
-
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite", temperature=0.3, api_key=os.getenv("GEMINI_API_KEY"))
-    
-    llm_summary = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.2, api_key=os.getenv("GEMINI_API_KEY"))
-    memory = ConversationSummaryMemory(llm=llm_summary, memory_key="chat_history", return_messages=True)
-
-    # � Charger les guidelines d'amélioration
-    guidelines = load_guidelines()
-    guidelines_text = guidelines.get("summary", "Aucune guideline disponible")
+from agents.manager_agent import format_guidelines, get_guideline_index
+from agents.llm_clients import get_llm
+from utils.reranker import FETCH_K, RerankingRetriever, get_reranker, rerank_enabled
 
-    # 🔧 Ton prompt personnalisé
-    template = """
+# Prompt de l'agent de support (aussi utilisé par tests/benchmark_rerank.py pour compter les tokens)
+SUPPORT_TEMPLATE = """
     Tu es un agent de support client Fnac.
 
     - Ta mission : répondre uniquement à la QUESTION DU CLIENT en te basant uniquement sur le CONTEXTE fourni ci-dessous.
@@ -37,6 +22,9 @@ def agent_support_fnac():
     === CONTEXTE ===
     {context}
 
+    === DIRECTIVES D'AMÉLIORATION ===
+    {guidelines}
+
     === HISTORIQUE ===
     {chat_history}
 
@@ -45,9 +33,42 @@ def agent_support_fnac():
 
     === RÉPONSE ===
     """
+    
+        
+def agent_support_fnac(embedding=None, vectordb=None, rerank=None):
+    """
+    Construit l'agent de support.
+
+    Args:
+        embedding: Modèle d'embedding déjà chargé (optionnel, partagé entre workers)
+        vectordb: Base vectorielle déjà ouverte (optionnel, ex: SharedIndex en mode multi-worker)
+        rerank: Active le reranking cross-encoder (par défaut : variable SUPPORT_RERANK)
+    """
+    if embedding is None:
+        embedding = HuggingFaceEmbeddings(model_name="embaas/sentence-transformers-multilingual-e5-base")
+    if vectordb is None:
+        vectordb = Chroma(persist_directory="./vectorstore/chroma", embedding_function=embedding)
+    if rerank is None:
+        rerank = rerank_enabled()
+    if rerank:
+        # Sur-échantillonner puis ne garder que les documents proches du meilleur score
+        retriever = RerankingRetriever(
+            base_retriever=vectordb.as_retriever(search_kwargs={"k": FETCH_K}),
+            reranker=get_reranker()
+        )
+    else:
+        retriever = vectordb.as_retriever(search_kwargs={"k": 5})
+
+    # Clients partagés par le processus (limite de débit, retry, disjoncteur)
+    llm = get_llm("gemini-2.5-flash-lite", temperature=0.3)
+    
+    llm_summary = get_llm("gemini-2.5-flash", temperature=0.2)
+    memory = ConversationSummaryMemory(llm=llm_summary, memory_key="chat_history", input_key="question", return_messages=True)
+
+    # 🔧 Ton prompt personnalisé
     prompt = PromptTemplate(
-        input_variables=["context", "chat_history", "question"],
-        template=template,
+        input_variables=["context", "chat_history", "question", "guidelines"],
+        template=SUPPORT_TEMPLATE,
     )
 
     # 🔑 CRÉER LA CHAÎNE UNE SEULE FOIS (pas à chaque appel)
@@ -62,15 +83,13 @@ def agent_support_fnac():
     
     # Fonction appelée pour chaque message
     def run_support(query: str):
-        # Injecter les guidelines dans la question
-        augmented_query = f"""Voici les directives d'amélioration à prendre en compte:
-        {guidelines_text}
-
-        Question originale du client:
-        {query}
-        """
+        # 📚 Injecter uniquement les guidelines pertinentes pour cette question
+        # (index partagé par le processus, relu seulement si le fichier a changé ;
+        # la question reste intacte pour la recherche documentaire et la mémoire)
+        guidelines_text = format_guidelines(get_guideline_index(embedding).search(query))
         response = qa_chain.invoke({
-            "question": augmented_query
+            "question": query,
+            "guidelines": guidelines_text
         })
         # Essaye plusieurs clés possibles
         if isinstance(response, dict):
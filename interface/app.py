@@ -1,10 +1,11 @@
 import gradio as gr
 import time
 from agents.support_agent import agent_support_fnac
-from agents.analytics_agent import init_analytics_db, analytics_agent
+from agents.analytics_agent import init_analytics_db, analytics_agent, start_pending_replayer
 
 # --- Initialisation ---
 init_analytics_db()
+start_pending_replayer()  # rejoue les analyses en attente hors des clics
 support_agent, memory = agent_support_fnac()
 conversation_start_time = None
 
@@ -50,6 +51,11 @@ def handle_end_conversation(chat_history):
         duration=duration
     )
     
+    if analysis_result.get("status") == "pending":
+        return "⏳ Analyse mise en attente : le service d'analyse est momentanément indisponible.", None
+    if analysis_result.get("status") == "failed":
+        return "❌ Analyse impossible : réponse invalide du service d'analyse.", None
+
     # Formater le rapport pour l'affichage
     report = f"""
     ## Rapport d'Analyse de la Conversation
@@ -0,0 +1,7 @@
+# interface/preload.py
+# Importé une seule fois par le forkserver (voir interface/serve.py) : le modèle e5,
+# l'index partagé et le reranker sont chargés dans ce processus mono-thread, dont
+# chaque worker est ensuite forké (partage copy-on-write, sans fork d'un parent multi-thread).
+from interface.serve import load_shared_resources
+
+load_shared_resources()
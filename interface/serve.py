@@ -0,0 +1,392 @@
+# interface/serve.py
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty
+
+# Ajoute le dossier racine du projet au path Python
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.analytics_agent import (
+    analytics_agent,
+    init_analytics_db,
+    run_analytics_writer,
+    run_pending_replayer,
+    set_analytics_writer,
+)
+from utils.llm_pool import pool_from_env, set_pool
+
+EMBEDDING_MODEL = "embaas/sentence-transformers-multilingual-e5-base"
+SESSION_TTL = 30 * 60  # secondes d'inactivité avant d'oublier une session
+REQUEST_TIMEOUT = 120  # secondes
+SUPERVISE_INTERVAL = 5  # secondes entre deux vérifications des processus
+# Requêtes traitées en parallèle par worker (sessions différentes)
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", os.getenv("LLM_MAX_IN_FLIGHT", "4")))
+
+# Ressources chargées une seule fois par le forkserver (interface/preload.py) :
+# les workers forkés en héritent en copy-on-write au lieu de recharger le modèle e5.
+_shared = {}
+
+
+# ==========================
+# Ressources partagées
+# ==========================
+def load_shared_resources() -> dict:
+    """Charge le modèle d'embedding et l'index memory-mappé (une fois par processus)."""
+    if not _shared:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from utils.shared_index import load_shared_index
+
+        embedding = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        _shared["embedding"] = embedding
+        _shared["index"] = load_shared_index(embedding)
+
+        from utils.reranker import get_reranker, rerank_enabled
+        if rerank_enabled():
+            get_reranker()  # préchargé par le forkserver, comme le modèle e5
+    return _shared
+
+
+# ==========================
+# Worker : agents LLM + sessions
+# ==========================
+def worker_main(worker_id: int, n_workers: int, requests, responses, writer_queue) -> None:
+    """
+    Boucle d'un worker. Chaque worker possède ses propres clients LLM et ses
+    sessions ; les messages d'une même session sont toujours routés vers lui.
+    Les requêtes sont traitées par un petit pool de threads : un appel LLM lent
+    ne bloque que sa propre session (un verrou par session garde l'ordre des messages).
+    """
+    from agents.support_agent import agent_support_fnac
+
+    # Le quota du fournisseur est global : chaque worker en reçoit une part
+    # (le processus de rejeu des analyses en attente compte pour une part)
+    set_pool(pool_from_env(n_workers + 1))
+    set_analytics_writer(writer_queue)
+    shared = load_shared_resources()  # déjà chargé si le worker vient du forkserver
+    sessions = {}
+    sessions_lock = threading.Lock()
+    print(f"👷 Worker {worker_id} prêt (pid {os.getpid()})")
+
+    def get_session(session_id: str) -> dict:
+        with sessions_lock:
+            # Oublier les sessions inactives
+            now = time.time()
+            for sid in [s for s, st in sessions.items() if now - st["last_seen"] > SESSION_TTL]:
+                del sessions[sid]
+
+            session = sessions.get(session_id)
+            if session is None:
+                session = {"lock": threading.Lock(), "agent": None, "start": now, "history": []}
+                sessions[session_id] = session
+            session["last_seen"] = now
+            return session
+
+    def handle(request_id: str, session_id: str, action: str, payload: dict) -> None:
+        try:
+            if action == "chat":
+                session = get_session(session_id)
+                with session["lock"]:
+                    if session["agent"] is None:
+                        session["agent"], _ = agent_support_fnac(
+                            embedding=shared["embedding"],
+                            vectordb=shared["index"]
+                        )
+                    answer = session["agent"](payload["message"])
+                    session["history"].append((payload["message"], answer))
+                result = {"session_id": session_id, "answer": answer, "worker": worker_id}
+
+            elif action == "end":
+                with sessions_lock:
+                    session = sessions.pop(session_id, None)
+                if session is None or not session["history"]:
+                    result = {"error": "Session inconnue ou expirée", "code": 404}
+                else:
+                    with session["lock"]:  # attendre la fin d'un message en cours
+                        history = session["history"]
+                        result = analytics_agent(
+                            user_message=history[-1][0],
+                            agent_response=history[-1][1],
+                            chat_history="\n".join([f"Client: {u}\nAgent: {a}" for u, a in history]),
+                            duration=time.time() - session["start"]
+                        )
+            else:
+                result = {"error": f"Action inconnue: {action}", "code": 400}
+        except Exception as e:
+            print(f"❌ Worker {worker_id}: {e}")
+            result = {"error": str(e)}
+
+        responses.put((request_id, result))
+
+    with ThreadPoolExecutor(max_workers=WORKER_THREADS) as executor:
+        while True:
+            item = requests.get()
+            if item is None:
+                break
+            executor.submit(handle, *item)
+
+
+def writer_main(writer_queue) -> None:
+    """Écrivain analytics : le modèle e5 (préchargé) sert à encoder les nouvelles guidelines."""
+    run_analytics_writer(writer_queue, load_shared_resources()["embedding"])
+
+
+def replayer_main(writer_queue, quota_shares: int) -> None:
+    """
+    Rejoue les analyses en attente dans son propre processus : les appels LLM
+    (et leurs backoffs) ne bloquent ni les workers ni les écritures SQLite.
+    """
+    set_pool(pool_from_env(quota_shares))
+    set_analytics_writer(writer_queue)  # les résultats passent par l'écrivain unique
+    run_pending_replayer()
+
+
+# ==========================
+# Pool de workers
+# ==========================
+class WorkerPool:
+    """
+    Démarre l'écrivain analytics et N workers, route les requêtes par session
+    et redémarre les processus morts.
+    """
+
+    def __init__(self, n_workers: int):
+        # Les processus sont forkés depuis un forkserver mono-thread qui a préchargé
+        # le modèle e5 : un redémarrage ne forke jamais ce parent multi-thread
+        # (serveur HTTP, collecteurs). Sans forkserver (Windows), spawn recharge le modèle.
+        if "forkserver" in mp.get_all_start_methods():
+            self.ctx = mp.get_context("forkserver")
+            self.ctx.set_forkserver_preload(["interface.preload"])
+        else:
+            self.ctx = mp.get_context("spawn")
+        self.n_workers = n_workers
+        self.restarts = 0
+        self._closing = False
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        self.writer_queue = self.ctx.Queue()
+        self._start_writer()
+        self._start_replayer()
+
+        # Une file de requêtes et une file de réponses par worker : un worker tué
+        # pendant une écriture ne peut bloquer que ses propres files, recréées au redémarrage
+        self.requests = [None] * n_workers
+        self.responses = [None] * n_workers
+        self.workers = [None] * n_workers
+        for i in range(n_workers):
+            self._start_worker(i)
+
+        threading.Thread(target=self._supervise, daemon=True).start()
+
+    def _start_writer(self) -> None:
+        self.writer = self.ctx.Process(
+            target=writer_main,
+            args=(self.writer_queue,),
+            daemon=True
+        )
+        self.writer.start()
+
+    def _start_replayer(self) -> None:
+        self.replayer = self.ctx.Process(
+            target=replayer_main,
+            args=(self.writer_queue, self.n_workers + 1),
+            daemon=True
+        )
+        self.replayer.start()
+
+    def _start_worker(self, worker_id: int) -> None:
+        requests, responses = self.ctx.Queue(), self.ctx.Queue()
+        with self._lock:
+            self.requests[worker_id] = requests
+            self.responses[worker_id] = responses
+            # Les requêtes confiées au worker précédent sont perdues avec lui : réponse immédiate
+            lost = [rid for rid, (wid, _) in self._pending.items() if wid == worker_id]
+            futures = [self._pending.pop(rid)[1] for rid in lost]
+        for future in futures:
+            future.set_result({"error": "Worker redémarré, session perdue", "code": 503})
+
+        self.workers[worker_id] = self.ctx.Process(
+            target=worker_main,
+            args=(worker_id, self.n_workers, requests, responses, self.writer_queue),
+            daemon=True
+        )
+        self.workers[worker_id].start()
+        threading.Thread(target=self._collect, args=(worker_id, responses), daemon=True).start()
+
+    def _supervise(self) -> None:
+        """Relance les workers et l'écrivain morts (leurs sessions en mémoire sont perdues)."""
+        while not self._closing:
+            time.sleep(SUPERVISE_INTERVAL)
+            if self._closing:
+                break
+            for i, worker in enumerate(self.workers):
+                if not worker.is_alive():
+                    print(f"⚠️ Worker {i} mort (code {worker.exitcode}), redémarrage...")
+                    self._start_worker(i)
+                    self.restarts += 1
+            if not self.writer.is_alive():
+                print(f"⚠️ Écrivain analytics mort (code {self.writer.exitcode}), redémarrage...")
+                self._start_writer()
+                self.restarts += 1
+            if not self.replayer.is_alive():
+                print(f"⚠️ Processus de rejeu mort (code {self.replayer.exitcode}), redémarrage...")
+                self._start_replayer()
+                self.restarts += 1
+
+    def _collect(self, worker_id: int, responses) -> None:
+        """Transmet les réponses d'un worker aux threads HTTP en attente (jusqu'à son remplacement)."""
+        while not self._closing and self.responses[worker_id] is responses:
+            try:
+                request_id, result = responses.get(timeout=1)
+            except Empty:
+                continue
+            with self._lock:
+                entry = self._pending.pop(request_id, None)
+            if entry is not None:
+                entry[1].set_result(result)
+
+    def submit(self, session_id: str, action: str, payload: dict) -> dict:
+        """
+        Envoie une requête au worker propriétaire de la session et attend sa réponse.
+
+        Raises:
+            FutureTimeoutError: si le worker n'a pas répondu dans REQUEST_TIMEOUT secondes
+        """
+        worker_id = zlib.crc32(session_id.encode("utf-8")) % len(self.workers)
+        request_id = uuid.uuid4().hex
+        future = Future()
+        with self._lock:
+            self._pending[request_id] = (worker_id, future)
+            requests = self.requests[worker_id]
+        requests.put((request_id, session_id, action, payload))
+        try:
+            return future.result(timeout=REQUEST_TIMEOUT)
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+    def status(self) -> dict:
+        return {
+            "workers": len(self.workers),
+            "alive": [w.is_alive() for w in self.workers],
+            "writer_alive": self.writer.is_alive(),
+            "replayer_alive": self.replayer.is_alive(),
+            "restarts": self.restarts
+        }
+
+    def shutdown(self) -> None:
+        self._closing = True
+        for queue in self.requests:
+            queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=10)
+        self.replayer.terminate()
+        self.writer_queue.put(None)
+        self.writer.join(timeout=10)
+
+
+# ==========================
+# Serveur HTTP (un seul port)
+# ==========================
+def make_handler(pool: WorkerPool):
+    class SupportHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, data: dict) -> None:
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, pool.status())
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": "JSON invalide"})
+                return
+
+            if self.path == "/chat":
+                if not payload.get("message"):
+                    self._send_json(400, {"error": "Champ 'message' manquant"})
+                    return
+                session_id = payload.get("session_id") or uuid.uuid4().hex
+                request = (session_id, "chat", {"message": payload["message"]})
+            elif self.path == "/end":
+                if not payload.get("session_id"):
+                    self._send_json(400, {"error": "Champ 'session_id' manquant"})
+                    return
+                request = (payload["session_id"], "end", {})
+            else:
+                self._send_json(404, {"error": "Not found"})
+                return
+
+            try:
+                result = pool.submit(*request)
+            except FutureTimeoutError:
+                self._send_json(504, {"error": "Le worker n'a pas répondu à temps"})
+                return
+
+            status = result.pop("code", None)  # 404 session inconnue, 503 worker redémarré...
+            if status is None:
+                if result.get("status") == "pending":
+                    status = 202  # analyse mise en attente, elle sera rejouée
+                elif result.get("status") == "failed":
+                    status = 502  # réponse invalide du LLM d'analyse (voir failed_analytics)
+                elif "error" in result:
+                    status = 500
+                else:
+                    status = 200
+            self._send_json(status, result)
+
+        def log_message(self, format, *args):
+            pass  # pas de log par requête (bruyant en test de charge)
+
+    return SupportHandler
+
+
+def serve(host: str = "127.0.0.1", port: int = 7861, n_workers: int = 2) -> None:
+    """Lance l'écrivain analytics, N workers et le serveur HTTP."""
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")  # sûr avant fork
+    init_analytics_db()
+    # Le modèle e5 n'est pas chargé ici : le forkserver le charge (interface/preload.py)
+
+    pool = WorkerPool(n_workers)
+    server = ThreadingHTTPServer((host, port), make_handler(pool))
+    print(f"🚀 Serveur multi-worker ({n_workers} workers) sur http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("👋 Arrêt du serveur...")
+    finally:
+        server.server_close()
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mode de service multi-worker de l'agent Fnac")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7861)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    # Les processus enfants doivent référencer le module interface.serve préchargé
+    # par le forkserver, et non ce script ré-importé sous le nom __mp_main__
+    from interface.serve import serve as run_server
+    run_server(args.host, args.port, args.workers)
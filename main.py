@@ -1,7 +1,7 @@
 # main.py
 import os
 from agents.support_agent import agent_support_fnac
-from agents.analytics_agent import init_analytics_db, analytics_agent
+from agents.analytics_agent import init_analytics_db, analytics_agent, start_pending_replayer
 import time
 
 def main():
@@ -10,6 +10,7 @@ def main():
     
     # 🔹 Initialisation base analytics
     init_analytics_db()
+    start_pending_replayer()
     
     # 🔹 Création de ton agent
     agent, memory = agent_support_fnac()
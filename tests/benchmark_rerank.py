@@ -0,0 +1,116 @@
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+# Ajoute le dossier racine du projet au path Python
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_chroma import Chroma
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from agents.llm_clients import get_llm
+from agents.manager_agent import format_guidelines, get_guideline_index
+from agents.support_agent import SUPPORT_TEMPLATE
+from utils.reranker import FETCH_K, MIN_RELEVANCE, SCORE_MARGIN, RerankingRetriever, get_reranker
+
+
+# --- Chargement des questions du CSV ---
+def load_questions():
+    csv_path = os.path.join(os.path.dirname(__file__), "test_scenarios.csv")
+    df = pd.read_csv(csv_path, sep=";")
+    return [
+        (row.test_name, row.conversation_steps.split(";")[0].strip())
+        for row in df.itertuples(index=False)
+    ]
+
+
+def prompt_tokens(llm, documents, question, guidelines):
+    """
+    Tokens du prompt complet envoyé à Gemini au premier tour (consignes, contexte,
+    directives, question), comptés par le tokenizer du modèle.
+    Le contexte est assemblé comme par la chaîne LangChain (documents séparés par une ligne vide).
+    """
+    prompt = SUPPORT_TEMPLATE.format(
+        context="\n\n".join(doc.page_content for doc in documents),
+        guidelines=guidelines,
+        chat_history="",
+        question=question
+    )
+    return llm.get_num_tokens(prompt)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+# --- Exécution globale ---
+if __name__ == "__main__":
+    embedding = HuggingFaceEmbeddings(model_name="embaas/sentence-transformers-multilingual-e5-base")
+    vectordb = Chroma(persist_directory="./vectorstore/chroma", embedding_function=embedding)
+    baseline = vectordb.as_retriever(search_kwargs={"k": 5})
+    candidates = vectordb.as_retriever(search_kwargs={"k": FETCH_K})
+    reranker = get_reranker()
+    reranking = RerankingRetriever(base_retriever=candidates, reranker=reranker)
+    llm = get_llm("gemini-2.5-flash-lite", temperature=0.3)
+    guideline_index = get_guideline_index(embedding)
+
+    rows = []
+    for test_name, question in load_questions():
+        baseline_docs, baseline_ms = timed(baseline.invoke, question)
+        candidate_docs, fetch_ms = timed(candidates.invoke, question)
+        scores, rerank_cold_ms = timed(reranker.score, question, candidate_docs)
+        _, rerank_cached_ms = timed(reranker.score, question, candidate_docs)
+        reranked_docs = reranking.invoke(question)
+        guidelines = format_guidelines(guideline_index.search(question))
+        ordered = sorted(scores, reverse=True)
+
+        rows.append({
+            "test_name": test_name,
+            "docs_baseline": len(baseline_docs),
+            "docs_rerank": len(reranked_docs),
+            # Logits bruts, pour vérifier SCORE_MARGIN et MIN_RELEVANCE sur ce corpus
+            "best_logit": round(ordered[0], 2) if ordered else None,
+            "second_logit": round(ordered[1], 2) if len(ordered) > 1 else None,
+            "above_floor": sum(score >= MIN_RELEVANCE for score in scores),
+            "prompt_tokens_baseline": prompt_tokens(llm, baseline_docs, question, guidelines),
+            "prompt_tokens_rerank": prompt_tokens(llm, reranked_docs, question, guidelines),
+            "retrieval_ms": round(baseline_ms, 1),
+            "fetch_k_ms": round(fetch_ms, 1),
+            "rerank_ms": round(rerank_cold_ms, 1),
+            "rerank_cached_ms": round(rerank_cached_ms, 1),
+            # Surcoût total : sur-échantillonnage (k=15 au lieu de 5) + reranking
+            "added_ms": round(fetch_ms + rerank_cold_ms - baseline_ms, 1),
+            "added_cached_ms": round(fetch_ms + rerank_cached_ms - baseline_ms, 1),
+        })
+
+    report_df = pd.DataFrame(rows)
+    print("\n📊 RERANKING CROSS-ENCODER")
+    print("────────────────────────────")
+    print(report_df.to_string(index=False))
+
+    tokens_baseline = report_df["prompt_tokens_baseline"].sum()
+    tokens_rerank = report_df["prompt_tokens_rerank"].sum()
+    reduction = 100 * (1 - tokens_rerank / tokens_baseline) if tokens_baseline else 0.0
+    print("\n────────────────────────────")
+    print(f"Documents moyens   : {report_df['docs_baseline'].mean():.1f} -> {report_df['docs_rerank'].mean():.1f}")
+    print(f"Tokens du prompt complet (tokenizer Gemini, premier tour) : "
+          f"{tokens_baseline} -> {tokens_rerank} (-{reduction:.1f} %)")
+    print(f"Seuils : MIN_RELEVANCE={MIN_RELEVANCE}, SCORE_MARGIN={SCORE_MARGIN} ; "
+          f"{(report_df['above_floor'] == 0).sum()}/{len(report_df)} questions sans document au-dessus du seuil, "
+          f"meilleur logit médian {report_df['best_logit'].median():.2f}")
+    print(f"Latence ajoutée (fetch k={FETCH_K} + rerank - retrieval k=5) : "
+          f"médiane {statistics.median(report_df['added_ms']):.1f} ms, max {report_df['added_ms'].max():.1f} ms "
+          f"(scores en cache : médiane {statistics.median(report_df['added_cached_ms']):.1f} ms)")
+    print(f"  dont reranker seul : médiane {statistics.median(report_df['rerank_ms']):.1f} ms")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_path = f"tests/results/rerank_benchmark_{timestamp}.csv"
+    os.makedirs("tests/results", exist_ok=True)
+    report_df.to_csv(report_path, index=False)
+    print(f"\n🗂️ Rapport sauvegardé dans : {report_path}")
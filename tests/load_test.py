@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import statistics
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+
+# --- Chargement des conversations simulées ---
+def load_conversations():
+    csv_path = os.path.join(os.path.dirname(__file__), "test_scenarios.csv")
+    df = pd.read_csv(csv_path, sep=";")
+    return [
+        [step.strip() for step in steps.split(";") if step.strip()]
+        for steps in df["conversation_steps"]
+    ]
+
+
+def post_json(url, payload, timeout=180):
+    data = json.dumps(payload).encode("utf-8")
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+# --- Une conversation simulée ---
+def run_chat(base_url, steps, analyze):
+    session_id = uuid.uuid4().hex
+    latencies = []
+    errors = 0
+    for step in steps:
+        start = time.perf_counter()
+        try:
+            post_json(f"{base_url}/chat", {"session_id": session_id, "message": step})
+        except Exception as e:
+            print(f"⚠️ {e}")
+            errors += 1
+            continue
+        # Seuls les messages réussis comptent : un échec rapide fausserait latences et débit
+        latencies.append(time.perf_counter() - start)
+    if analyze:
+        try:
+            post_json(f"{base_url}/end", {"session_id": session_id})
+        except Exception as e:
+            print(f"⚠️ {e}")
+            errors += 1
+    return latencies, errors
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+# --- Exécution globale ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de charge du serveur multi-worker (interface/serve.py)")
+    parser.add_argument("--url", default="http://127.0.0.1:7861")
+    parser.add_argument("--concurrency", type=int, default=4, help="Conversations simultanées")
+    parser.add_argument("--chats", type=int, default=20, help="Nombre total de conversations")
+    parser.add_argument("--analyze", action="store_true", help="Appeler /end (analyse LLM) après chaque conversation")
+    args = parser.parse_args()
+
+    conversations = load_conversations()
+    jobs = [conversations[i % len(conversations)] for i in range(args.chats)]
+
+    print(f"🔥 {args.chats} conversations, {args.concurrency} en parallèle -> {args.url}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda steps: run_chat(args.url, steps, args.analyze), jobs))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for chat_latencies, _ in results for latency in chat_latencies]
+    errors = sum(chat_errors for _, chat_errors in results)
+    completed = sum(1 for _, chat_errors in results if chat_errors == 0)
+
+    print("\n📊 RÉSULTATS DU TEST DE CHARGE")
+    print("────────────────────────────")
+    print(f"Durée totale       : {elapsed:.2f} s")
+    print(f"Messages réussis   : {len(latencies)} ({errors} erreurs)")
+    print(f"Conversations      : {completed}/{len(jobs)} sans erreur")
+    print(f"Débit (succès)     : {len(latencies) / elapsed:.2f} messages/s, {completed / elapsed:.2f} conversations/s")
+    if latencies:
+        print(f"Latence moyenne    : {statistics.mean(latencies):.2f} s")
+        print(f"Latence p50 / p95  : {percentile(latencies, 50):.2f} s / {percentile(latencies, 95):.2f} s")
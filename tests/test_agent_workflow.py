@@ -40,13 +40,20 @@ def run_conversation_test(test_name, conversation_steps, expected_satisfaction_o
     # Analyse post-conversation
     conversation_history = memory.load_memory_variables({})["chat_history"]
     last_user_message = steps[-1]
-    analytics_agent(
+    analysis = analytics_agent(
         user_message=last_user_message,
         agent_response="",
         chat_history=conversation_history,
         duration=100.0
     )
 
+    if analysis["status"] == "pending":
+        print("⚠️ Analyse mise en attente (LLM indisponible).")
+        return False
+    if analysis["status"] == "failed":
+        print(f"⚠️ Analyse invalide : {analysis['last_error']}")
+        return False
+
     # Lecture du résultat depuis SQLite
     conn = sqlite3.connect("data/analytics/analytics.db")
     cursor = conn.cursor()
@@ -0,0 +1,208 @@
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+
+# Ajoute le dossier racine du projet au path Python
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import agents.analytics_agent as analytics
+import agents.llm_clients as llm_clients
+import agents.manager_agent as manager
+from agents.llm_clients import PooledChatModel
+from utils import llm_pool
+from utils.llm_pool import LLMPool, LLMUnavailableError
+
+
+class ResourceExhausted(Exception):
+    """Même nom que l'erreur de quota de google.api_core."""
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeAnalysisLLM:
+    """Remplace le client Gemini d'analyse : indisponible tant que `available` est False."""
+
+    def __init__(self):
+        self.available = False
+        self.calls = 0
+        self.response = json.dumps({
+            "theme": "livraison",
+            "satisfaction_score": 0.9,
+            "remarque": "ok",
+            "improvement_suggestion": None
+        })
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if not self.available:
+            raise LLMUnavailableError("quota")
+        return FakeResponse(self.response)
+
+
+class FlakyChatModel(BaseChatModel):
+    failures: int = 0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "flaky"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ResourceExhausted("429 quota exceeded")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+
+@pytest.fixture
+def fast_pool():
+    previous = llm_pool.get_pool()
+    llm_pool.set_pool(LLMPool(requests_per_minute=60_000, burst=100, base_delay=0.01, max_delay=0.05))
+    yield
+    llm_pool.set_pool(previous)
+
+
+@pytest.fixture
+def analytics_db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(analytics, "_writer_queue", None)
+    monkeypatch.setattr(manager, "manager_update", lambda embedding=None: {})
+    fake_llm = FakeAnalysisLLM()
+    monkeypatch.setattr(analytics, "get_llm", lambda model, temperature: fake_llm)
+    analytics.init_analytics_db()
+    return fake_llm
+
+
+def query(sql):
+    conn = sqlite3.connect("data/analytics/analytics.db")
+    rows = conn.execute(sql).fetchall()
+    conn.close()
+    return rows
+
+
+# --- Analyses en attente ---
+def test_failed_analysis_is_queued_not_faked(analytics_db):
+    analysis = analytics.analytics_agent("Merci", "De rien", "Client: Merci", 12.0)
+
+    assert analysis["status"] == "pending"
+    assert analysis["satisfaction_score"] is None
+    assert query("SELECT COUNT(*) FROM chat_analytics") == [(0,)]
+    assert query("SELECT chat_id, attempts FROM pending_analytics") == [(analysis["chat_id"], 1)]
+
+
+def test_pending_analysis_is_replayed_then_deleted(analytics_db):
+    analysis = analytics.analytics_agent("Merci", "De rien", "Client: Merci", 12.0)
+
+    # Toujours indisponible : l'analyse reste en attente, avec un échec de plus
+    assert analytics.process_pending_analytics() == 0
+    assert query("SELECT attempts FROM pending_analytics") == [(2,)]
+
+    analytics_db.available = True
+    assert analytics.process_pending_analytics() == 1
+    assert query("SELECT chat_id, satisfaction_score FROM chat_analytics") == [(analysis["chat_id"], 0.9)]
+    assert query("SELECT COUNT(*) FROM pending_analytics") == [(0,)]
+
+
+def test_analytics_agent_does_not_replay_inline(analytics_db):
+    pending = analytics.analytics_agent("Merci", "De rien", "Client: Merci", 12.0)
+
+    analytics_db.available = True
+    analytics_db.calls = 0
+    analysis = analytics.analytics_agent("Au revoir", "Bonne journée", "Client: Au revoir", 5.0)
+
+    # Une seule analyse LLM pendant la requête : le rejeu tourne à part
+    assert analysis["status"] == "ok"
+    assert analytics_db.calls == 1
+    assert query("SELECT chat_id FROM pending_analytics") == [(pending["chat_id"],)]
+
+
+def test_replayer_drains_pending_when_idle(analytics_db):
+    pending = analytics.analytics_agent("Merci", "De rien", "Client: Merci", 12.0)
+    analytics_db.available = True
+
+    stop = threading.Event()
+    replayer = threading.Thread(target=analytics.run_pending_replayer, kwargs={"interval": 0.01, "stop_event": stop})
+    replayer.start()
+    deadline = time.monotonic() + 5
+    while query("SELECT COUNT(*) FROM pending_analytics") != [(0,)] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stop.set()
+    replayer.join()
+
+    assert query("SELECT chat_id FROM chat_analytics") == [(pending["chat_id"],)]
+
+
+def test_pending_analysis_marked_failed_after_max_attempts(analytics_db, monkeypatch):
+    monkeypatch.setattr(analytics, "MAX_PENDING_ATTEMPTS", 2)
+    analysis = analytics.analytics_agent("Merci", "De rien", "Client: Merci", 12.0)
+    analytics.process_pending_analytics()  # 2e échec
+
+    assert query("SELECT COUNT(*) FROM pending_analytics") == [(0,)]
+    assert query("SELECT chat_id, attempts FROM failed_analytics") == [(analysis["chat_id"], 2)]
+    calls = analytics_db.calls
+    assert analytics.process_pending_analytics() == 0
+    assert analytics_db.calls == calls  # plus rejouée
+
+
+# --- Réponses invalides ---
+def test_fenced_json_is_parsed(analytics_db):
+    analytics_db.available = True
+    analytics_db.response = "```json\n" + analytics_db.response + "\n```"
+
+    analysis = analytics.analytics_agent("Merci", "De rien", "Client: Merci", 12.0)
+    assert analysis["status"] == "ok"
+    assert analysis["satisfaction_score"] == 0.9
+
+
+def test_invalid_response_is_failed_not_queued(analytics_db):
+    analytics_db.available = True
+    analytics_db.response = json.dumps({"theme": "livraison", "remarque": "pas de score"})
+
+    analysis = analytics.analytics_agent("Merci", "De rien", "Client: Merci", 12.0)
+    assert analysis["status"] == "failed"
+    assert query("SELECT COUNT(*) FROM pending_analytics") == [(0,)]
+    assert query("SELECT chat_id, raw_response FROM failed_analytics") == [(analysis["chat_id"], analytics_db.response)]
+
+
+# --- Écrivain unique ---
+def test_writer_only_writes(analytics_db):
+    writer_queue = queue.Queue()
+    pending = analytics.analyze_conversation("Merci", "De rien", "Client: Merci", 12.0)  # LLM indisponible
+    analytics_db.available = True
+    writer_queue.put(pending)
+    writer_queue.put(None)
+    calls = analytics_db.calls
+
+    analytics.run_analytics_writer(writer_queue)
+    assert analytics_db.calls == calls  # aucun appel LLM dans l'écrivain
+    assert query("SELECT COUNT(*) FROM pending_analytics") == [(1,)]
+
+
+# --- Clients LLM partagés ---
+def test_pooled_chat_model_retries_through_pool(fast_pool):
+    inner = FlakyChatModel(failures=2)
+    llm = PooledChatModel(inner=inner, model_key="gemini-test")
+
+    assert llm.invoke("Bonjour").content == "ok"
+    assert inner.calls == 3
+
+
+def test_get_llm_shares_clients(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_clients, "_clients", {})
+
+    assert llm_clients.get_llm("gemini-2.5-flash", 0.2) is llm_clients.get_llm("gemini-2.5-flash", 0.2)
+    assert llm_clients.get_llm("gemini-2.5-flash", 0.2) is not llm_clients.get_llm("gemini-2.5-flash-lite", 0.2)
@@ -0,0 +1,165 @@
+import os
+import sys
+
+# Ajoute le dossier racine du projet au path Python
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.manager_agent import (
+    GuidelineIndex,
+    deduplicate_guidelines,
+    format_guidelines,
+    get_guideline_index,
+    load_guideline_vectors,
+    load_guidelines,
+    store_guidelines,
+)
+
+
+ENTRIES = [
+    {"theme": "livraison", "suggestion": "Donner les délais de livraison précis pour chaque mode de livraison"},
+    {"theme": "livraison", "suggestion": "Donner des délais de livraison précis pour chaque mode de livraison."},
+    {"theme": "retour", "suggestion": "Expliquer la procédure de retour étape par étape"},
+    {"theme": "paiement", "suggestion": "Lister les moyens de paiement acceptés, dont la carte cadeau"},
+]
+
+
+def test_near_duplicates_are_merged():
+    entries = deduplicate_guidelines(ENTRIES)
+
+    assert len(entries) == 3
+    assert entries[0]["suggestion"] == ENTRIES[0]["suggestion"]  # la plus récente est gardée
+    assert entries[0]["occurrences"] == 2
+
+
+def test_same_suggestion_kept_per_theme():
+    entries = deduplicate_guidelines([
+        {"theme": "retour", "suggestion": "Préciser les délais de remboursement"},
+        {"theme": "livraison", "suggestion": "Préciser les délais de remboursement"},
+    ])
+
+    assert [e["theme"] for e in entries] == ["retour", "livraison"]
+    assert [e["theme"] for e in GuidelineIndex(entries).search("livraison")] == ["livraison"]
+
+
+def test_search_returns_only_relevant_guidelines():
+    index = GuidelineIndex(deduplicate_guidelines(ENTRIES))
+
+    results = index.search("Quels sont les délais de livraison en point relais ?")
+    assert [e["theme"] for e in results] == ["livraison"]
+
+    assert index.search("Quelle est la météo demain ?") == []
+
+
+def test_theme_keyed_lookup():
+    index = GuidelineIndex(deduplicate_guidelines(ENTRIES))
+
+    results = index.search("Je veux faire un retour")
+    assert results[0]["theme"] == "retour"
+
+
+def test_prompt_size_is_bounded():
+    many = [
+        {"theme": "livraison", "suggestion": f"Préciser la livraison pour le cas {i}"}
+        for i in range(200)
+    ]
+    index = GuidelineIndex(many)
+
+    results = index.search("Comment suivre ma livraison ?", k=3)
+    assert len(results) == 3
+    assert format_guidelines([]) == "Aucune directive particulière."
+
+
+# --- Mode vectoriel (embedding simulé) ---
+class StubEmbedding:
+    """Embedding par concepts : "colis" et "relais" partagent une dimension."""
+
+    CONCEPTS = [("livraison",), ("colis", "relais"), ("delais",), ("retour",)]
+
+    def __init__(self):
+        self.documents = []
+        self.queries = []
+
+    def _vector(self, text):
+        words = text.lower().replace("é", "e").split()
+        return [float(sum(w.strip("?.,") in concept for w in words)) for concept in self.CONCEPTS]
+
+    def embed_documents(self, texts):
+        self.documents.extend(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return self._vector(text)
+
+
+VECTOR_ENTRIES = [
+    {"theme": "livraison", "suggestion": "Indiquer les délais de livraison"},
+    {"theme": "livraison", "suggestion": "Proposer le retrait en relais pour la livraison"},
+]
+
+
+def test_store_guidelines_persists_embeddings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    embedding = StubEmbedding()
+
+    store_guidelines({"entries": [dict(e) for e in VECTOR_ENTRIES]}, embedding)
+    assert len(load_guideline_vectors()) == 2
+    assert all(t.startswith("passage: ") for t in embedding.documents)
+    # Les vecteurs sont hors du JSON
+    assert all("embedding" not in e for e in load_guidelines()["entries"])
+
+    # Seules les nouvelles suggestions sont encodées ; sans modèle, les vecteurs existants sont conservés
+    new = {"theme": "retour", "suggestion": "Expliquer le retour"}
+    store_guidelines({"entries": [dict(e) for e in VECTOR_ENTRIES] + [new]}, embedding)
+    assert len(embedding.documents) == 3
+    store_guidelines({"entries": [dict(e) for e in VECTOR_ENTRIES]})
+    assert len(load_guideline_vectors()) == 2
+
+
+def test_vector_path_ranks_keyword_candidates(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    embedding = StubEmbedding()
+    store_guidelines({"entries": [dict(e) for e in VECTOR_ENTRIES]}, embedding)
+    index = GuidelineIndex.from_guidelines(load_guidelines(), embedding, load_guideline_vectors())
+    assert index.vectors is not None
+    assert len(embedding.documents) == 2  # rien n'est ré-encodé
+
+    # Mots-clés à égalité ("livraison") : le cosinus départage ("colis" ~ "relais")
+    results = index.search("Livraison de mon colis")
+    assert results[0]["suggestion"] == VECTOR_ENTRIES[1]["suggestion"]
+    assert embedding.queries == ["query: Livraison de mon colis"]
+
+
+def test_vectors_recall_paraphrases():
+    index = GuidelineIndex(deduplicate_guidelines(VECTOR_ENTRIES), StubEmbedding())
+
+    # Aucun mot commun avec les guidelines : seul le vecteur ("colis" ~ "relais") les relie
+    results = index.search("Où est mon colis ?")
+    assert [e["suggestion"] for e in results] == [VECTOR_ENTRIES[1]["suggestion"]]
+
+
+def test_missing_embeddings_are_encoded_lazily(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    embedding = StubEmbedding()
+    # La première guideline est stockée avec son vecteur, la seconde ajoutée sans modèle
+    store_guidelines({"entries": [dict(VECTOR_ENTRIES[0])]}, embedding)
+    store_guidelines({"entries": [dict(e) for e in VECTOR_ENTRIES]})
+
+    index = GuidelineIndex.from_guidelines(load_guidelines(), embedding, load_guideline_vectors())
+    assert index.vectors.shape == (2, len(StubEmbedding.CONCEPTS))
+    # Seule l'entrée sans vecteur stocké est encodée par l'index
+    assert embedding.documents == ["passage: " + e["suggestion"] for e in VECTOR_ENTRIES]
+
+
+def test_index_cached_until_file_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    embedding = StubEmbedding()
+    store_guidelines({"entries": [dict(VECTOR_ENTRIES[0])]}, embedding)
+
+    index = get_guideline_index(embedding)
+    assert get_guideline_index(embedding) is index
+
+    store_guidelines({"entries": [dict(e) for e in VECTOR_ENTRIES]}, embedding)
+    refreshed = get_guideline_index(embedding)
+    assert refreshed is not index
+    assert len(refreshed.entries) == 2
@@ -0,0 +1,180 @@
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Ajoute le dossier racine du projet au path Python
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.llm_pool import CircuitOpenError, LLMPool, LLMUnavailableError
+
+
+# --- Faux fournisseur LLM local ---
+class FakeLLMServer:
+    """Serveur HTTP local : répond 429 pour les `fail_first` premiers appels, puis 200."""
+
+    def __init__(self, fail_first=0, delay=0.0):
+        self.fail_first = fail_first
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                with fake._lock:
+                    fake.calls += 1
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                    failing = fake.calls <= fake.fail_first
+                time.sleep(fake.delay)
+                with fake._lock:
+                    fake.in_flight -= 1
+
+                status = 429 if failing else 200
+                body = json.dumps({"error": "quota"} if failing else {"content": "ok"}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/generate"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def invoke(self):
+        request = urllib.request.Request(self.url, data=b"{}", method="POST")
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read())["content"]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def _make(**kwargs):
+        server = FakeLLMServer(**kwargs)
+        servers.append(server)
+        return server
+
+    yield _make
+    for server in servers:
+        server.close()
+
+
+def make_pool(**kwargs):
+    config = dict(requests_per_minute=60_000, burst=100, base_delay=0.01, max_delay=0.05)
+    config.update(kwargs)
+    return LLMPool(**config)
+
+
+# --- Tests ---
+def test_retry_after_quota_errors(make_server):
+    server = make_server(fail_first=2)
+    pool = make_pool(max_retries=3)
+
+    assert pool.call("gemini", server.invoke) == "ok"
+    assert server.calls == 3
+    assert pool.breaker_state("gemini") == "closed"
+
+
+def test_unavailable_after_retries(make_server):
+    server = make_server(fail_first=100)
+    pool = make_pool(max_retries=2, failure_threshold=10)
+
+    with pytest.raises(LLMUnavailableError):
+        pool.call("gemini", server.invoke)
+    assert server.calls == 3
+
+
+def test_circuit_opens_then_recovers(make_server):
+    server = make_server(fail_first=3)
+    pool = make_pool(max_retries=0, failure_threshold=3, cooldown=0.2)
+
+    for _ in range(3):
+        with pytest.raises(LLMUnavailableError):
+            pool.call("gemini", server.invoke)
+    assert pool.breaker_state("gemini") == "open"
+
+    # Circuit ouvert : le serveur n'est plus appelé
+    with pytest.raises(CircuitOpenError):
+        pool.call("gemini", server.invoke)
+    assert server.calls == 3
+
+    # Après le cooldown, l'appel d'essai réussit et referme le circuit
+    time.sleep(0.25)
+    assert pool.call("gemini", server.invoke) == "ok"
+    assert pool.breaker_state("gemini") == "closed"
+
+
+def test_circuit_is_per_model(make_server):
+    server = make_server(fail_first=1)
+    pool = make_pool(max_retries=0, failure_threshold=1, cooldown=60)
+
+    with pytest.raises(LLMUnavailableError):
+        pool.call("gemini-flash", server.invoke)
+    assert pool.breaker_state("gemini-flash") == "open"
+    assert pool.call("gemini-flash-lite", server.invoke) == "ok"
+
+
+def test_bounded_in_flight(make_server):
+    server = make_server(delay=0.1)
+    pool = make_pool(max_in_flight=2)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: pool.call("gemini", server.invoke), range(8)))
+
+    assert results == ["ok"] * 8
+    assert server.max_in_flight <= 2
+
+
+def test_rate_limit(make_server):
+    server = make_server()
+    pool = make_pool(requests_per_minute=600, burst=1)  # 10 requêtes/s
+
+    start = time.monotonic()
+    for _ in range(4):
+        pool.call("gemini", server.invoke)
+    assert time.monotonic() - start >= 0.25
+
+
+def test_failed_probe_with_non_retryable_error_reopens_circuit(make_server):
+    server = make_server()
+    pool = make_pool(max_retries=0, failure_threshold=1, cooldown=0.1)
+
+    def timeout():
+        raise TimeoutError("timeout")
+
+    def bad_request():
+        raise ValueError("400 Bad Request")
+
+    with pytest.raises(LLMUnavailableError):
+        pool.call("gemini", timeout)
+    assert pool.breaker_state("gemini") == "open"
+
+    # L'appel d'essai échoue sur une erreur non transitoire : le circuit se rouvre
+    time.sleep(0.15)
+    with pytest.raises(ValueError):
+        pool.call("gemini", bad_request)
+    assert pool.breaker_state("gemini") == "open"
+
+    # ... et se réarme : un nouvel essai est autorisé après le cooldown
+    time.sleep(0.15)
+    assert pool.call("gemini", server.invoke) == "ok"
+    assert pool.breaker_state("gemini") == "closed"
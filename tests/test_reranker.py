@@ -0,0 +1,46 @@
+import os
+import sys
+
+# Ajoute le dossier racine du projet au path Python
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.documents import Document
+
+from utils.reranker import select_by_margin
+
+
+def scored(*logits):
+    return [(Document(page_content=f"doc{i}"), score) for i, score in enumerate(logits)]
+
+
+def names(kept):
+    return [doc.page_content for doc, _ in kept]
+
+
+def test_obvious_question_keeps_the_winner():
+    # Logits 8 / 3 / 2 : avec une sigmoïde (0.9997 / 0.95 / 0.88), les 3 seraient gardés
+    assert names(select_by_margin(scored(8.0, 3.0, 2.0, -1.0, -4.0))) == ["doc0"]
+
+
+def test_ambiguous_question_keeps_more_documents():
+    kept = select_by_margin(scored(6.0, 5.5, 5.0, 4.2, 3.5, 3.2, -2.0))
+    assert names(kept) == ["doc0", "doc1", "doc2", "doc3", "doc4"]  # plafonné à max_k
+
+
+def test_irrelevant_documents_are_dropped():
+    # Proches du meilleur mais sous le seuil de pertinence
+    assert names(select_by_margin(scored(2.0, 0.5, -0.5, -0.8))) == ["doc0", "doc1"]
+
+
+def test_all_weak_applies_margin_without_floor():
+    # Aucun document jugé pertinent : on ne réduit pas le contexte sur un score peu fiable
+    assert names(select_by_margin(scored(-3.0, -3.2, -3.5, -4.0))) == ["doc0", "doc1", "doc2", "doc3"]
+    assert names(select_by_margin(scored(-3.0, -3.2, -7.5))) == ["doc0", "doc1"]
+
+
+def test_min_k_overrides_margin():
+    assert names(select_by_margin(scored(9.0, 1.0, 0.5), min_k=2)) == ["doc0", "doc1"]
+
+
+def test_empty():
+    assert select_by_margin([]) == []
@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+# Ajoute le dossier racine du projet au path Python
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.shared_index import DOCUMENTS_FILE, EMBEDDINGS_FILE, SharedIndex
+
+
+class StubEmbedding:
+    """Encode une requête par un vecteur fixe, indépendamment du texte."""
+
+    def __init__(self, vector):
+        self.vector = vector
+
+    def embed_query(self, text):
+        return self.vector
+
+
+def make_index(tmp_path, embedding=None):
+    vectors = np.array([
+        [1.0, 0.0, 0.0],
+        [0.0, 1.0, 0.0],
+        [0.7, 0.7, 0.0],
+        [0.0, 0.0, 1.0],
+    ], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.save(tmp_path / EMBEDDINGS_FILE, vectors)
+    records = [{"page_content": name, "metadata": {}} for name in ["a", "b", "ab", "c"]]
+    (tmp_path / DOCUMENTS_FILE).write_text(json.dumps(records), encoding="utf-8")
+    return SharedIndex(embedding, str(tmp_path))
+
+
+def test_ranking_by_cosine(tmp_path):
+    index = make_index(tmp_path)
+
+    # Le vecteur de requête n'a pas besoin d'être normalisé
+    docs = index.similarity_search_by_vector([2.0, 0.2, 0.0], k=3)
+    assert [d.page_content for d in docs] == ["a", "ab", "b"]
+
+
+def test_k_larger_than_index(tmp_path):
+    index = make_index(tmp_path)
+
+    docs = index.similarity_search_by_vector([0.0, 0.0, 1.0], k=10)
+    assert len(docs) == 4
+    assert docs[0].page_content == "c"
+
+
+def test_embeddings_are_memory_mapped(tmp_path):
+    index = make_index(tmp_path)
+
+    assert isinstance(index.embeddings, np.memmap)
+    assert not index.embeddings.flags.writeable
+
+
+def test_retriever_uses_query_embedding(tmp_path):
+    index = make_index(tmp_path, StubEmbedding([0.0, 1.0, 0.1]))
+
+    docs = index.as_retriever(search_kwargs={"k": 1}).invoke("question")
+    assert [d.page_content for d in docs] == ["b"]
+
+
+def test_empty_index(tmp_path):
+    # Export d'une collection Chroma vide
+    np.save(tmp_path / EMBEDDINGS_FILE, np.zeros((0, 0), dtype=np.float32))
+    (tmp_path / DOCUMENTS_FILE).write_text("[]", encoding="utf-8")
+    index = SharedIndex(StubEmbedding([1.0, 0.0, 0.0]), str(tmp_path))
+
+    assert index.similarity_search("question") == []
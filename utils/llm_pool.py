@@ -0,0 +1,224 @@
+# utils/llm_pool.py
+import os
+import random
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Codes HTTP considérés comme transitoires (quota, surcharge, timeout)
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_EXCEPTIONS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "DeadlineExceeded", "InternalServerError", "GatewayTimeout",
+}
+
+
+class LLMUnavailableError(Exception):
+    """Le fournisseur LLM n'a pas répondu malgré les tentatives."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Le disjoncteur du modèle est ouvert : l'appel n'est pas tenté."""
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """Indique si une erreur est transitoire (quota, surcharge, réseau)."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if callable(code):  # erreurs gRPC : code() renvoie un StatusCode
+        code = getattr(code(), "name", None)
+    if code in RETRYABLE_STATUS or code in ("RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED"):
+        return True
+    if type(exc).__name__ in RETRYABLE_EXCEPTIONS:
+        return True
+    message = str(exc).lower()
+    return "429" in message or "quota" in message or "rate limit" in message
+
+
+# ==========================
+# Limiteur de débit (token bucket)
+# ==========================
+class TokenBucket:
+    """Token bucket : `rate` jetons par seconde, au plus `capacity` en réserve."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Bloque jusqu'à obtenir un jeton."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# ==========================
+# Disjoncteur
+# ==========================
+class CircuitBreaker:
+    """
+    Disjoncteur à trois états :
+    - closed : les appels passent ;
+    - open : après `failure_threshold` échecs consécutifs, les appels sont refusés pendant `cooldown` secondes ;
+    - half_open : un seul appel d'essai est autorisé, son résultat referme ou rouvre le circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half_open"
+                return True  # appel d'essai
+            return self.state == "closed"
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+# ==========================
+# Pool d'appels LLM
+# ==========================
+class _ModelState:
+    def __init__(self, pool: "LLMPool"):
+        self.bucket = TokenBucket(pool.requests_per_minute / 60.0, capacity=pool.burst)
+        self.in_flight = threading.BoundedSemaphore(pool.max_in_flight)
+        self.breaker = CircuitBreaker(pool.failure_threshold, pool.cooldown)
+
+
+class LLMPool:
+    """
+    Encadre les appels LLM par modèle : limite de débit, nombre borné de requêtes
+    simultanées, retry avec backoff exponentiel jittered et disjoncteur.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 60,
+        burst: float = 5,
+        max_in_flight: int = 4,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 20.0,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        is_retryable: Callable[[Exception], bool] = is_retryable_error
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.is_retryable = is_retryable
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _state(self, model: str) -> _ModelState:
+        with self._lock:
+            if model not in self._models:
+                self._models[model] = _ModelState(self)
+            return self._models[model]
+
+    def breaker_state(self, model: str) -> str:
+        """État du disjoncteur d'un modèle ("closed", "open" ou "half_open")."""
+        return self._state(model).breaker.state
+
+    def call(self, model: str, fn: Callable[[], T]) -> T:
+        """
+        Exécute `fn` (un appel au modèle `model`) sous les contraintes du pool.
+
+        Raises:
+            CircuitOpenError: si le disjoncteur du modèle est ouvert
+            LLMUnavailableError: si les erreurs transitoires persistent après les retries
+        """
+        state = self._state(model)
+        for attempt in range(self.max_retries + 1):
+            if not state.breaker.allow():
+                raise CircuitOpenError(f"Circuit ouvert pour {model}")
+
+            state.bucket.acquire()
+            with state.in_flight:
+                try:
+                    result = fn()
+                except Exception as e:
+                    if not self.is_retryable(e):
+                        # Un appel d'essai qui échoue, quelle que soit l'erreur, rouvre
+                        # le circuit (sinon il resterait bloqué en half_open)
+                        if state.breaker.state == "half_open":
+                            state.breaker.record_failure()
+                        raise
+                    state.breaker.record_failure()
+                    last_error = e
+                else:
+                    state.breaker.record_success()
+                    return result
+
+            if attempt < self.max_retries:
+                # Full jitter : évite que tous les clients réessaient en même temps
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+        raise LLMUnavailableError(f"{model} indisponible après {self.max_retries + 1} tentatives: {last_error}") from last_error
+
+
+_default_pool: Optional[LLMPool] = None
+_default_lock = threading.Lock()
+
+
+def pool_from_env(shares: int = 1) -> LLMPool:
+    """
+    Crée un pool configuré par variables d'environnement.
+
+    Args:
+        shares: Nombre de processus qui se partagent le quota LLM_REQUESTS_PER_MINUTE
+    """
+    return LLMPool(
+        requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60")) / shares,
+        max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "4"))
+    )
+
+
+def get_pool() -> LLMPool:
+    """Pool partagé par le processus, configuré par variables d'environnement."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = pool_from_env()
+        return _default_pool
+
+
+def set_pool(pool: LLMPool) -> None:
+    """Remplace le pool partagé (ex: quota réparti entre plusieurs workers)."""
+    global _default_pool
+    with _default_lock:
+        _default_pool = pool
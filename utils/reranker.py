@@ -0,0 +1,142 @@
+# utils/reranker.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, List, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Petit cross-encoder multilingue (MiniLM), utilisable sur CPU
+RERANKER_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+FETCH_K = 15      # candidats sur-échantillonnés avant reranking
+MIN_K = 1         # documents toujours envoyés au LLM
+MAX_K = 5         # plafond (= ancien k fixe)
+# Les scores sont les logits bruts du cross-encoder (environ -10 à +10) : avec une
+# sigmoïde, ils saturent près de 0 ou 1 et une marge fixe ne discrimine plus rien
+SCORE_MARGIN = 3.0   # écart max (en logits) au meilleur score pour garder un document
+MIN_RELEVANCE = 0.0  # logit minimum (probabilité 0.5) pour qu'un document soit jugé pertinent
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def rerank_enabled() -> bool:
+    """Le reranking est activé par la variable d'environnement SUPPORT_RERANK=1."""
+    return os.getenv("SUPPORT_RERANK", "0").lower() in ("1", "true", "yes")
+
+
+# ==========================
+# Cross-encoder avec cache de scores
+# ==========================
+class CrossEncoderReranker:
+    """Score des paires (question, document) par lots, avec un cache LRU des scores."""
+
+    def __init__(self, model_name: str = RERANKER_MODEL, batch_size: int = 16, cache_size: int = 4096):
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        # Activation identité : on garde les logits (paramètre renommé en v4)
+        try:
+            self.model = CrossEncoder(model_name, device="cpu", activation_fn=torch.nn.Identity())
+        except TypeError:
+            self.model = CrossEncoder(model_name, device="cpu", default_activation_function=torch.nn.Identity())
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(query: str, document: Document) -> Tuple[str, str]:
+        return query, hashlib.sha1(document.page_content.encode("utf-8")).hexdigest()
+
+    def score(self, query: str, documents: List[Document]) -> List[float]:
+        """
+        Retourne un score de pertinence (logit brut) par document.
+        Seules les paires absentes du cache sont envoyées au modèle, en un seul lot.
+        """
+        keys = [self._key(query, doc) for doc in documents]
+        scores = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+
+        missing = [(key, doc) for key, doc in zip(keys, documents) if key not in scores]
+        if missing:
+            pairs = [(query, doc.page_content) for _, doc in missing]
+            predictions = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            with self._lock:
+                for (key, _), value in zip(missing, predictions):
+                    scores[key] = float(value)
+                    self._cache[key] = float(value)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [scores[key] for key in keys]
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """Reranker partagé par le processus (chargé une seule fois)."""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = CrossEncoderReranker()
+        return _reranker
+
+
+# ==========================
+# Sélection adaptative
+# ==========================
+def select_by_margin(
+    scored: List[Tuple[Document, float]],
+    min_k: int = MIN_K,
+    max_k: int = MAX_K,
+    margin: float = SCORE_MARGIN,
+    min_score: float = MIN_RELEVANCE
+) -> List[Tuple[Document, float]]:
+    """
+    Garde les documents pertinents dont le score est proche du meilleur.
+    Question évidente (un score largement en tête) : 1 ou 2 documents ;
+    question ambiguë (plusieurs scores pertinents et serrés) : jusqu'à max_k documents ;
+    aucun document au-dessus du seuil (reranker peu sûr) : la marge seule s'applique,
+    pour ne pas envoyer moins de contexte qu'avant le reranking.
+
+    Args:
+        scored: Paires (document, score) triées par score décroissant
+        min_k: Nombre minimum de documents gardés
+        max_k: Nombre maximum de documents gardés
+        margin: Écart maximum au meilleur score (logits)
+        min_score: Score minimum (logit) d'un document pertinent
+
+    Returns:
+        list: Paires (document, score) retenues
+    """
+    if not scored:
+        return []
+    best = scored[0][1]
+    floor = min_score if best >= min_score else float("-inf")
+    kept = [item for item in scored[:max_k] if item[1] >= floor and best - item[1] <= margin]
+    return kept if len(kept) >= min_k else scored[:min_k]
+
+
+class RerankingRetriever(BaseRetriever):
+    """Sur-échantillonne avec le retriever de base, rerank, puis coupe par marge de score."""
+
+    base_retriever: BaseRetriever
+    reranker: Any
+    min_k: int = MIN_K
+    max_k: int = MAX_K
+    margin: float = SCORE_MARGIN
+    min_score: float = MIN_RELEVANCE
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        candidates = self.base_retriever.invoke(query)
+        scores = self.reranker.score(query, candidates)
+        scored = sorted(zip(candidates, scores), key=lambda item: item[1], reverse=True)
+        return [doc for doc, _ in select_by_margin(scored, self.min_k, self.max_k, self.margin, self.min_score)]
@@ -0,0 +1,150 @@
+# utils/shared_index.py
+import json
+import os
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+DB_PATH = "./vectorstore/chroma"
+SHARED_PATH = "./vectorstore/shared"
+EMBEDDINGS_FILE = "embeddings.npy"
+DOCUMENTS_FILE = "documents.json"
+
+
+# ==========================
+# Export de la base Chroma vers un index partagé
+# ==========================
+def export_shared_index(db_path: str = DB_PATH, shared_path: str = SHARED_PATH) -> str:
+    """
+    Exporte les embeddings de la base Chroma dans un fichier .npy (normalisé)
+    et les documents dans un fichier JSON, pour une lecture en memory-map.
+
+    Args:
+        db_path: Dossier de la base Chroma persistée
+        shared_path: Dossier de sortie de l'index partagé
+
+    Returns:
+        str: Chemin du dossier de l'index partagé
+    """
+    from langchain_chroma import Chroma
+
+    print("📦 Export de la base vectorielle vers l'index partagé...")
+    vectordb = Chroma(persist_directory=db_path)
+    data = vectordb.get(include=["embeddings", "documents", "metadatas"])
+
+    raw = data["embeddings"]
+    embeddings = np.asarray(raw if raw is not None else [], dtype=np.float32)
+    if embeddings.size == 0:
+        embeddings = embeddings.reshape(0, 0)  # collection vide : la recherche renverra []
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = embeddings / np.maximum(norms, 1e-12)
+
+    records = [
+        {"page_content": content, "metadata": metadata or {}}
+        for content, metadata in zip(data["documents"], data["metadatas"])
+    ]
+
+    # Écriture atomique : les workers ne voient jamais un fichier à moitié écrit
+    os.makedirs(shared_path, exist_ok=True)
+    embeddings_path = os.path.join(shared_path, EMBEDDINGS_FILE)
+    documents_path = os.path.join(shared_path, DOCUMENTS_FILE)
+    with open(embeddings_path + ".tmp", "wb") as f:
+        np.save(f, embeddings)
+    with open(documents_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False)
+    os.replace(embeddings_path + ".tmp", embeddings_path)
+    os.replace(documents_path + ".tmp", documents_path)
+
+    print(f"✅ {len(records)} documents exportés dans {shared_path}")
+    return shared_path
+
+
+def _is_stale(db_path: str, shared_path: str) -> bool:
+    """Indique si l'index partagé est absent ou plus ancien que la base Chroma."""
+    embeddings_path = os.path.join(shared_path, EMBEDDINGS_FILE)
+    documents_path = os.path.join(shared_path, DOCUMENTS_FILE)
+    if not (os.path.exists(embeddings_path) and os.path.exists(documents_path)):
+        return True
+    chroma_file = os.path.join(db_path, "chroma.sqlite3")
+    if not os.path.exists(chroma_file):
+        return False
+    return os.path.getmtime(chroma_file) > os.path.getmtime(embeddings_path)
+
+
+# ==========================
+# Index en lecture seule (memory-map)
+# ==========================
+class SharedIndex:
+    """
+    Index vectoriel en lecture seule, chargé en memory-map.
+    Les pages du fichier sont partagées par le cache de l'OS entre tous les
+    processus qui l'ouvrent : la matrice d'embeddings n'est pas dupliquée par worker.
+    """
+
+    def __init__(self, embedding_function: Any, shared_path: str = SHARED_PATH):
+        self.embedding_function = embedding_function
+        self.embeddings = np.load(os.path.join(shared_path, EMBEDDINGS_FILE), mmap_mode="r")
+        with open(os.path.join(shared_path, DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+            records = json.load(f)
+        self.documents = [
+            Document(page_content=r["page_content"], metadata=r["metadata"])
+            for r in records
+        ]
+
+    def similarity_search_by_vector(self, vector: List[float], k: int = 5) -> List[Document]:
+        """Retourne les k documents les plus proches (similarité cosinus)."""
+        if not self.documents:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = self.embeddings @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.documents[i] for i in top]
+
+    def similarity_search(self, query: str, k: int = 5) -> List[Document]:
+        """Recherche par texte : encode la requête puis cherche par vecteur."""
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k=k)
+
+    def as_retriever(self, search_kwargs: dict = None) -> "SharedIndexRetriever":
+        """Même interface que Chroma.as_retriever pour l'agent de support."""
+        search_kwargs = search_kwargs or {}
+        return SharedIndexRetriever(index=self, k=search_kwargs.get("k", 5))
+
+
+class SharedIndexRetriever(BaseRetriever):
+    """Retriever LangChain adossé à un SharedIndex."""
+
+    index: Any
+    k: int = 5
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.index.similarity_search(query, k=self.k)
+
+
+def load_shared_index(
+    embedding_function: Any,
+    db_path: str = DB_PATH,
+    shared_path: str = SHARED_PATH
+) -> SharedIndex:
+    """
+    Charge l'index partagé, en le (ré)exportant depuis Chroma si nécessaire.
+
+    Args:
+        embedding_function: Modèle d'embedding utilisé pour encoder les requêtes
+        db_path: Dossier de la base Chroma
+        shared_path: Dossier de l'index partagé
+
+    Returns:
+        SharedIndex: Index prêt à l'emploi
+    """
+    if _is_stale(db_path, shared_path):
+        export_shared_index(db_path, shared_path)
+    return SharedIndex(embedding_function, shared_path)